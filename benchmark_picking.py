@@ -0,0 +1,75 @@
+import sys
+import time
+import numpy as np
+
+from components.picking import TriangleBVH, intersect_triangles
+
+# Triangle BVH ray casts against a brute force test of every triangle.
+# The mesh is a noisy sphere; rays start around it and aim near its center.
+#   python benchmark_picking.py [triangles ...]
+
+
+def make_sphere(triangles, rng):
+    n = int(np.sqrt(triangles / 2)) + 1
+    u, v = np.meshgrid(np.linspace(0, np.pi, n), np.linspace(0, 2*np.pi, n), indexing='ij')
+    positions = np.stack([np.sin(u)*np.cos(v), np.cos(u), np.sin(u)*np.sin(v)], axis=-1).reshape(-1, 3)
+    positions += rng.normal(0, 0.2 / n, positions.shape)
+
+    i = (np.arange(n-1)[:, None]*n + np.arange(n-1)[None]).reshape(-1)
+    indices = np.stack([i, i+1, i+n, i+1, i+n+1, i+n], axis=-1).reshape(-1)
+    return positions.astype(np.float32), indices.astype(np.uint32)
+
+
+def make_rays(count, rng):
+    origins = rng.normal(0, 1, (count, 3))
+    origins *= 3 / np.linalg.norm(origins, axis=1, keepdims=True)
+    directions = rng.normal(0, 0.3, (count, 3)) - origins
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return origins, directions
+
+
+def run(triangles, rng, rays=200, report=True):
+    positions, indices = make_sphere(triangles, rng)
+    origins, directions = make_rays(rays, rng)
+
+    start = time.perf_counter()
+    bvh = TriangleBVH(positions, indices)
+    build = time.perf_counter() - start
+
+    times = []
+    for origin, direction in zip(origins, directions):
+        start = time.perf_counter()
+        bvh.intersect(origin, direction)
+        times.append(time.perf_counter() - start)
+    times = np.array(times)
+
+    # brute force on a few rays, which also checks the results
+    corners = positions[indices.reshape(-1, 3).astype(np.int64)]
+    start = time.perf_counter()
+    for origin, direction in zip(origins[:10], directions[:10]):
+        t = intersect_triangles(origin.astype(np.float32), direction.astype(np.float32), corners[:, 0], corners[:, 1], corners[:, 2])
+        hit = bvh.intersect(origin, direction)
+        assert (hit is None) == np.isinf(t.min()) and (hit is None or abs(hit[0] - t.min()) < 1e-5)
+    brute = (time.perf_counter() - start) / 10
+
+    if not report:
+        return
+    ms = lambda seconds: f'{1000*seconds:9.3f}'
+    print(f'{len(indices)//3:>9} {ms(build)} | {ms(np.median(times))} {ms(np.percentile(times, 95))} {ms(times.max())} | {ms(brute)}')
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+    rng = np.random.default_rng(0)
+
+    # first calls pay for numpy warm-up
+    run(1000, rng, report=False)
+
+    print('times in ms')
+    print(f'{"triangles":>9} {"build":>9} | {"median":>9} {"p95":>9} {"max":>9} | {"brute":>9}')
+    for count in counts:
+        run(count, rng)
+
+
+if __name__ == '__main__':
+    main()
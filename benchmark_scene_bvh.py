@@ -0,0 +1,106 @@
+import sys
+import time
+import glm
+import numpy as np
+
+from components.objects import GLMesh, GLObject
+from components.bounds import Bounds, Frustum
+from components.scene_bvh import SceneBVH
+
+# Scene BVH against a linear scan over object bounds, for growing object counts.
+# Objects are unit boxes scattered over a square; the camera looks at a small part of it.
+#   python benchmark_scene_bvh.py [count ...]
+
+
+def make_scene(count, rng):
+    extent = 4 * np.sqrt(count)
+    positions = rng.uniform(-extent, extent, (count, 3)).astype(np.float32)
+    positions[:, 1] = rng.uniform(0, 2, count)
+
+    mesh = GLMesh()
+    mesh.bounds = Bounds((-0.5, -0.5, -0.5), (0.5, 0.5, 0.5))
+    objects = []
+    for position in positions:
+        object = GLObject(mesh=mesh, shape_transform=glm.translate(glm.vec3(*position)))
+        object.update_world_bounds()
+        objects.append(object)
+    return objects, extent
+
+
+def timed(func, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def linear_frustum(objects, frustum):
+    return [object for object in objects if frustum.contains(object.get_world_bounds())]
+
+
+def linear_frustum_numpy(lo, hi, frustum):
+    return np.flatnonzero(frustum.classify_boxes(lo, hi) > 0)
+
+
+def linear_ray(lo, hi, origin, direction):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t0, t1 = (lo - origin) / direction, (hi - origin) / direction
+    near = np.nan_to_num(np.minimum(t0, t1), nan=-np.inf).max(axis=1)
+    far = np.nan_to_num(np.maximum(t0, t1), nan=np.inf).min(axis=1)
+    return np.flatnonzero(np.maximum(near, 0) <= far)
+
+
+def move(objects, fraction, rng):
+    for object in rng.choice(objects, max(1, int(fraction * len(objects))), replace=False):
+        object.set_transform(shape_transform=glm.translate(glm.vec3(*rng.uniform(-1, 1, 3))) * object.shape_transform)
+
+
+def run(count, rng, report=True):
+    objects, extent = make_scene(count, rng)
+
+    P = glm.perspective(glm.radians(45), 1, 0.1, 1000)
+    V = glm.lookAt(glm.vec3(0, 20, 30), glm.vec3(0, 0, 0), glm.vec3(0, 1, 0))
+    VP = P * V
+    origin = np.array([-extent, 1, 0], dtype=np.float32)
+    direction = np.array([1, 0, 0.01], dtype=np.float32)
+
+    build, scene = timed(lambda: SceneBVH(objects))
+
+    move(objects, 0.01, rng)
+    refit_few, _ = timed(scene.refit)
+    move(objects, 1.0, rng)
+    refit_all, _ = timed(scene.refit)
+
+    repeat = max(1, 20000 // count)
+    frustum_bvh, visible = timed(lambda: scene.query_frustum(Frustum(VP)), repeat)
+    frustum_linear, expected = timed(lambda: linear_frustum(objects, Frustum(VP)), max(1, repeat // 10))
+    lo = np.array([object.world_bounds.lo for object in objects])
+    hi = np.array([object.world_bounds.hi for object in objects])
+    frustum_numpy, _ = timed(lambda: linear_frustum_numpy(lo, hi, Frustum(VP)), repeat)
+    assert set(map(id, visible)) == set(map(id, expected))
+
+    ray_bvh, hits = timed(lambda: scene.query_ray(origin, direction), repeat)
+    ray_linear, expected = timed(lambda: linear_ray(lo, hi, origin, direction), repeat)
+    assert set(id(object) for _, object in hits) == set(id(objects[i]) for i in expected)
+
+    if not report:
+        return
+    ms = lambda seconds: f'{1000*seconds:9.3f}'
+    print(f'{count:>8} {ms(build)} {ms(refit_few)} {ms(refit_all)} | {len(visible):>6} {ms(frustum_bvh)} {ms(frustum_linear)} {ms(frustum_numpy)} | {len(hits):>5} {ms(ray_bvh)} {ms(ray_linear)}')
+
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000, 50000]
+    rng = np.random.default_rng(0)
+
+    # first calls pay for numpy warm-up
+    run(50, rng, report=False)
+
+    print('times in ms; linear is the per-object scan used without the BVH, numpy a vectorized scan')
+    print(f'{"objects":>8} {"build":>9} {"refit 1%":>9} {"refit all":>9} | {"shown":>6} {"frustum":>9} {"linear":>9} {"numpy":>9} | {"hits":>5} {"ray":>9} {"linear":>9}')
+    for count in counts:
+        run(count, rng)
+
+
+if __name__ == '__main__':
+    main()
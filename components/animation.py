@@ -1,43 +1,15 @@
 import numpy as np
 from .objects import *
+from .skeleton import *
+from .fk import *
+from .playback import PlaybackClock
+from .instancing import GLInstancedMesh
+from .bounds import transform_boxes
 
 default_color = [0.7, 0.7, 1]
 
-def calculate_rotation_matrix(p):
-    if p == glm.vec3(0, 0, 0):
-        return glm.mat4()
-    
-    eps = 1e-6
-    up_vector = glm.vec3(0, 1, 0)
-    p = glm.normalize(p)
-
-    axis = glm.cross(up_vector, p)
-    dot_product = glm.dot(up_vector, p)
-    
-    if abs(dot_product-1) < eps:
-        return glm.mat4()
-    if abs(dot_product+1) < eps:
-        return glm.mat4(
-            1, 0, 0, 0,
-            0, -1, 0, 0,
-            0, 0, -1, 0,
-            0, 0, 0, 1
-        )
-
-    angle = glm.acos(dot_product)
-
-    return glm.rotate(angle, axis)
-
-
-joint_transform = {
-    'XPOSITION': lambda x : glm.translate((x, 0, 0)),
-    'YPOSITION': lambda y : glm.translate((0, y, 0)),
-    'ZPOSITION': lambda z : glm.translate((0, 0, z)),
-    'XROTATION': lambda t : glm.rotate(glm.radians(t), (1, 0, 0)),
-    'YROTATION': lambda t : glm.rotate(glm.radians(t), (0, 1, 0)),
-    'ZROTATION': lambda t : glm.rotate(glm.radians(t), (0, 0, 1)),
-}
-
+INTERPOLATE_EULER = 0
+INTERPOLATE_QUATERNION = 1
 
 class SkeletonMesh(GLMesh):
     def __init__(self, enable_box=True):
@@ -88,110 +60,186 @@ class SkeletonMesh(GLMesh):
             #    0,4, 1,5, 2,6, 3,7,
             #    4,5, 5,6, 6,7, 7,4,
             #)
-            frame = glm.array(glm.uint32, 8, 9)
+            frame = glm.array(glm.uint32, 8, 9),
+            name = 'bones',
         )
 
 def normalize_angle(theta):
-    while theta < -180 or theta >= 180:
-        if theta < -180:
-            theta += 360
-        elif theta >= 180:
-            theta -= 360
-    return theta
-
-def slerp(channels, a, b, t):
+    # wrap into [-180, 180)
+    return (theta + 180) % 360 - 180
+
+def slerp(rotation_mask, a, b, t):
     diff = b - a
-    for i in range(len(channels)):
-        if channels[i][1:] == 'ROTATION':
-            diff[i] = normalize_angle(diff[i])
+    diff[..., rotation_mask] = normalize_angle(diff[..., rotation_mask])
     return a + t * diff
 
 
-class GLSkeleton(GLObject):
-    def __init__(self, name, parent, offset, channels, thickness, color=default_color, enable_mesh=True):
-        self.offset = offset
-        self.name = name
-        self.channels = channels
-        self.joint = glm.mat4()
-        self.color = color
-        self.enable_mesh = enable_mesh
+def get_bone_renderer():
+    # every bone of every clip is an instance of the same unit box
+    global _bone_renderer
+    if _bone_renderer is None:
+        _bone_renderer = GLInstancedMesh(SkeletonMesh())
+        _bone_renderer.prepare()
+    return _bone_renderer
 
-        super().__init__(
-            parent= parent, 
-            link_transform= glm.translate(parent.offset) if parent is not None else None, 
-            shape_transform= calculate_rotation_matrix(offset) * glm.scale(glm.vec3(thickness, glm.l2Norm(offset), thickness)), 
-            mesh = SkeletonMesh() if enable_mesh and glm.l2Norm(offset) > 0 else None
-        )
+_bone_renderer = None
+
+
+class GLSkeleton:
+    # Thin view of one joint of a GLAnimation, used by the UI
+    __slots__ = ('animation', 'index')
+
+    def __init__(self, animation, index):
+        self.animation = animation
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, GLSkeleton) and self.animation is other.animation and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.animation), self.index))
+
+    @property
+    def name(self):
+        return self.animation.topology.names[self.index]
+
+    @property
+    def offset(self):
+        return glm.vec3(*self.animation.topology.offsets[self.index])
+
+    @property
+    def channels(self):
+        return self.animation.topology.channels[self.index]
+
+    @property
+    def parent(self):
+        parent = self.animation.topology.parents[self.index]
+        return GLSkeleton(self.animation, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        return [GLSkeleton(self.animation, child) for child in self.animation.topology.children[self.index]]
+
+    @property
+    def color(self):
+        return tuple(float(c) for c in self.animation.colors[self.index])
+
+    @color.setter
+    def color(self, value):
+        self.animation.colors[self.index] = value
+
+    @property
+    def enable_mesh(self):
+        return bool(self.animation.enabled[self.index])
+
+    @enable_mesh.setter
+    def enable_mesh(self, value):
+        self.animation.enabled[self.index] = value
+
+    @property
+    def global_transform(self):
+        return glm.mat4(*self.animation.get_bone_transforms()[self.index].T.ravel())
 
-    def set_joint(self, channel_values, fix_origin=False):
-        self.joint = glm.mat4()
-        for i in range(len(self.channels)):
-            if not fix_origin or self.channels[i] not in ['XPOSITION', 'YPOSITION', 'ZPOSITION']:
-                self.joint *= joint_transform[self.channels[i]](channel_values[i])
 
 class GLAnimation:
-    def __init__(self, skeletons, roots, motion, frames, framerate):
-        self.skeletons= skeletons
-        self.roots= roots
+    def __init__(self, topology, motion, frames, framerate, name=''):
+        self.name= name
+        self.topology= topology
         self.motion= motion
         self.framerate= framerate
         self.frames= frames
         self.frame= -1
+        self.clock= PlaybackClock(framerate, frames)
+        self.pose= None     # arguments of the last set_frame call made for the clock
+
+        self.offset = np.zeros(3, dtype=np.float32)    # world position of the clip
+
+        self.colors = np.tile(np.array(default_color, dtype=np.float32), (topology.joint_cnt, 1))
+        self.enabled = topology.parents >= 0
+
+        # baked world transforms, see bake
+        self.baked = None
+
+        # world transform of every joint, in the joint's own frame after its channels are applied
+        self.set_joint_transforms(np.zeros(topology.channel_cnt, dtype=np.float32))
+
+    @property
+    def roots(self):
+        return list(self.topology.roots)
+
+    @property
+    def skeletons(self):
+        return [GLSkeleton(self, i) for i in range(self.topology.joint_cnt)]
 
     def prepare(self):
-        for skeleton in self.skeletons:
-            skeleton.prepare()
-        for root in self.roots:
-            self.skeletons[root].update_tree_global_transform()
-    
+        get_bone_renderer()
+
+    def bake(self, chunk_frames=256, max_bytes=512 << 20, report=None):
+        # needs no GL, so it can run on the loader pool; the result is swapped in with set_baked
+        baked = BakedTransforms(self.topology, self.motion, chunk_frames, max_bytes)
+        baked.fill(report=report)
+        return baked
+
+    def set_baked(self, baked):
+        self.baked = baked
+
+    def unbake(self):
+        self.baked = None
+
+    def set_joint_transforms(self, channel_values, fix_origin=False):
+        self.joint_transforms = forward_kinematics(self.topology, channel_values, fix_origin)
+
+    def get_bone_transforms(self):
+        bones = bone_transforms(self.topology, self.joint_transforms)
+        bones[..., :3, 3] += self.offset
+        return bones
+
+    def get_rest_bounds(self):
+        positions = forward_kinematics(self.topology, np.zeros(self.topology.channel_cnt, dtype=np.float32))[:, :3, 3]
+        return positions.min(axis=0), positions.max(axis=0)
+
     def set_frame(self, frame, fix_origin=False):
         self.frame = frame % self.frames
-        index = 0
-        for skeleton in self.skeletons:
-            if skeleton.channels is None:
-                continue
-            skeleton.set_joint(
-                self.motion[self.frame][index : index+len(skeleton.channels)], 
-                fix_origin
-            )
-            index += len(skeleton.channels)
-
-        for skeleton in self.skeletons:
-            if skeleton.parent is not None:
-                skeleton.joint_transform = skeleton.parent.joint
-
-        for root in self.roots:
-            self.skeletons[root].update_tree_global_transform()
-
-    def Draw(self, VP, uniform_locs, ignore_light, mode):
-        for skeleton in self.skeletons:
-            if skeleton.enable_mesh:
-                skeleton.Draw(VP, uniform_locs, ignore_light, mode, color=skeleton.color)
+        if self.baked is not None:
+            self.joint_transforms = self.baked.get(self.frame, fix_origin)
+        else:
+            self.set_joint_transforms(self.motion[self.frame], fix_origin)
+
+    def get_bone_models(self):
+        # (joints, (N, 4, 4) model matrices) of the bones drawn
+        visible = np.flatnonzero(self.enabled & self.topology.has_mesh)
+        return visible, self.get_bone_transforms()[visible] @ self.topology.shape_transforms[visible]
+
+    def Draw(self, VP, uniform_locs, ignore_light, mode, frustum=None):
+        visible, models = self.get_bone_models()
+
+        if frustum is not None and len(models) > 0:
+            bounds = get_bone_renderer().mesh.get_bounds()
+            inside = frustum.contains_boxes(*transform_boxes(bounds.lo, bounds.hi, models))
+            visible, models = visible[inside], models[inside]
+        get_bone_renderer().Draw(models, self.colors[visible], VP, uniform_locs, ignore_light, mode)
     
 
 class GLAnimationInterpolated(GLAnimation):
-    def __init__(self, skeletons, roots, motion, frames, framerate):
-        super().__init__(skeletons, roots, motion, frames, framerate)
+    def __init__(self, topology, motion, frames, framerate, name=''):
+        super().__init__(topology, motion, frames, framerate, name)
     
-    def set_frame(self, frame, factor= 0, fix_origin=False):
+    def set_frame(self, frame, factor= 0, fix_origin=False, mode=INTERPOLATE_EULER):
+        if factor == 0:
+            return super().set_frame(frame, fix_origin)
+
         self.frame = frame % self.frames
-        index = 0
-        for skeleton in self.skeletons:
-            if skeleton.channels is None:
-                continue
-            skeleton.set_joint(slerp(
-                skeleton.channels,
-                self.motion[self.frame][index : index+len(skeleton.channels)],
-                self.motion[(self.frame+1) % self.frames][index : index+len(skeleton.channels)],
-                factor
-            ), fix_origin)
-            index += len(skeleton.channels)
-
-        for skeleton in self.skeletons:
-            if skeleton.parent is not None:
-                skeleton.joint_transform = skeleton.parent.joint
-
-        for root in self.roots:
-            self.skeletons[root].update_tree_global_transform()
-
-    
\ No newline at end of file
+        if self.baked is not None:
+            # in-between frames blend the baked poses, whichever the mode
+            self.joint_transforms = self.baked.get_blended(self.frame, factor, fix_origin)
+            return
+
+        a = self.motion[self.frame]
+        b = self.motion[(self.frame+1) % self.frames]
+
+        if mode == INTERPOLATE_QUATERNION and self.topology.positions_first:
+            local = interpolated_local_transforms(self.topology, a, b, factor, fix_origin)
+            self.joint_transforms = global_transforms(self.topology, local)
+        else:
+            channel_values = slerp(self.topology.rotation_mask, a, b, factor)
+            self.set_joint_transforms(channel_values, fix_origin)
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Axis-aligned boxes and bounding spheres. Matrices are row-major (4, 4) arrays, as in fk.py.
+
+
+class Bounds:
+    __slots__ = ('lo', 'hi', 'center', 'radius')
+
+    def __init__(self, lo, hi, center=None, radius=None):
+        self.lo = np.asarray(lo, dtype=np.float32)
+        self.hi = np.asarray(hi, dtype=np.float32)
+        self.center = (self.lo + self.hi) / 2 if center is None else np.asarray(center, dtype=np.float32)
+        self.radius = float(np.linalg.norm(self.hi - self.lo)) / 2 if radius is None else float(radius)
+
+    def transformed(self, M):
+        # bounds of the box after an affine transform
+        M = np.asarray(M, dtype=np.float32)
+        center = M[:3, :3] @ ((self.lo + self.hi) / 2) + M[:3, 3]
+        extent = np.abs(M[:3, :3]) @ ((self.hi - self.lo) / 2)
+        sphere_center = M[:3, :3] @ self.center + M[:3, 3]
+        scale = np.linalg.norm(M[:3, :3], axis=0).max()
+        return Bounds(center - extent, center + extent, sphere_center, self.radius * scale)
+
+
+def compute_bounds(vertices):
+    # -> Bounds of (N, 3) positions, or None if there are none
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if len(vertices) == 0:
+        return None
+    lo, hi = vertices.min(axis=0), vertices.max(axis=0)
+    center = (lo + hi) / 2
+    radius = np.sqrt(((vertices - center)**2).sum(axis=1).max())
+    return Bounds(lo, hi, center, radius)
+
+
+def transform_boxes(lo, hi, models):
+    # world boxes of one local box under (N, 4, 4) transforms -> (N, 3) lo, (N, 3) hi
+    center = models[:, :3, :3] @ ((lo + hi) / 2) + models[:, :3, 3]
+    extent = np.abs(models[:, :3, :3]) @ ((hi - lo) / 2)
+    return center - extent, center + extent
+
+
+class Frustum:
+    # Planes of the clip volume of a view projection matrix; counts what it tests
+    def __init__(self, VP):
+        A = np.asarray(VP, dtype=np.float64)
+        planes = np.array([
+            A[3] + A[0], A[3] - A[0],
+            A[3] + A[1], A[3] - A[1],
+            A[3] + A[2], A[3] - A[2],
+        ])
+        planes /= np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+        self.normals = planes[:, :3]
+        self.offsets = planes[:, 3]
+
+        self.drawn = 0
+        self.culled = 0
+
+    def contains_boxes(self, lo, hi):
+        # (N,) mask of boxes at least partly inside; the corner furthest along each plane normal decides
+        lo, hi = np.atleast_2d(lo), np.atleast_2d(hi)
+        corners = np.where(self.normals[None, :, :] > 0, hi[:, None, :], lo[:, None, :])
+        inside = ((corners * self.normals[None]).sum(axis=2) + self.offsets >= 0).all(axis=1)
+
+        drawn = int(inside.sum())
+        self.drawn += drawn
+        self.culled += len(inside) - drawn
+        return inside
+
+    def classify_boxes(self, lo, hi):
+        # (N,) 0 outside, 1 partly inside, 2 fully inside; not counted
+        far = np.where(self.normals[None, :, :] > 0, hi[:, None, :], lo[:, None, :])
+        near = np.where(self.normals[None, :, :] > 0, lo[:, None, :], hi[:, None, :])
+        outside = ((far * self.normals[None]).sum(axis=2) + self.offsets < 0).any(axis=1)
+        inside = ((near * self.normals[None]).sum(axis=2) + self.offsets >= 0).all(axis=1)
+        return np.where(outside, 0, np.where(inside, 2, 1)).astype(np.int8)
+
+    def contains(self, bounds):
+        if bounds is None:
+            self.drawn += 1
+            return True
+        return bool(self.contains_boxes(bounds.lo, bounds.hi)[0])
+
+    def get_stats(self):
+        return {'drawn': self.drawn, 'culled': self.culled}
@@ -0,0 +1,120 @@
+import os
+import threading
+import json
+import shutil
+import hashlib
+import numpy as np
+
+# Parsed BVH files are cached next to the source file as
+#   <dir>/.bvhcache/<filename>.<key>/{hierarchy.json, motion.npy}
+# where <key> is derived from the absolute path, size and mtime of the source.
+CACHE_ENABLED = True
+CACHE_DIRNAME = '.bvhcache'
+CACHE_MAX_BYTES = 4 << 30  # per cache directory
+
+HIERARCHY_FILE = 'hierarchy.json'
+MOTION_FILE = 'motion.npy'
+
+
+def cache_key(path):
+    stat = os.stat(path)
+    key = f'{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}'
+    return hashlib.sha1(key.encode('UTF-8')).hexdigest()[:16]
+
+
+def get_cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+
+def get_entry_path(path):
+    return os.path.join(get_cache_dir(path), f'{os.path.basename(path)}.{cache_key(path)}')
+
+
+def get_entry_size(entry):
+    size = 0
+    for filename in os.listdir(entry):
+        size += os.path.getsize(os.path.join(entry, filename))
+    return size
+
+
+def load_cache(path):
+    if not CACHE_ENABLED:
+        return None
+
+    try:
+        entry = get_entry_path(path)
+        if not os.path.isdir(entry):
+            return None
+
+        with open(os.path.join(entry, HIERARCHY_FILE), 'r', encoding='UTF-8') as file:
+            hierarchy = json.load(file)
+        motion = np.load(os.path.join(entry, MOTION_FILE), mmap_mode='r')
+
+        if motion.shape != (hierarchy['frames'], sum(len(part.get('channels', [])) for part in hierarchy['parts'].values())):
+            return None
+
+        # last access time drives eviction
+        os.utime(entry)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return hierarchy, motion
+
+
+def save_cache(path, hierarchy, motion):
+    if not CACHE_ENABLED:
+        return
+
+    try:
+        entry = get_entry_path(path)
+        clear_cache(path)
+
+        tmp_entry = f'{entry}.tmp{os.getpid()}.{threading.get_ident()}'
+        os.makedirs(tmp_entry, exist_ok=True)
+
+        with open(os.path.join(tmp_entry, HIERARCHY_FILE), 'w', encoding='UTF-8') as file:
+            json.dump(hierarchy, file)
+        np.save(os.path.join(tmp_entry, MOTION_FILE), np.ascontiguousarray(motion, dtype=np.float32))
+
+        os.replace(tmp_entry, entry)
+        evict_cache(get_cache_dir(path))
+    except OSError as e:
+        print("Failed to write bvh cache:", e)
+
+
+def clear_cache(path):
+    # remove every entry of this file, including stale ones from older versions of it
+    cache_dir = get_cache_dir(path)
+    if not os.path.isdir(cache_dir):
+        return
+
+    prefix = f'{os.path.basename(path)}.'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and len(name) == len(prefix) + 16:
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+
+def evict_cache(cache_dir, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+
+    # entries of other loads may be written, replaced or cleared while this runs;
+    # their tmp directories are never evicted
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if '.tmp' in name or not os.path.isdir(entry):
+            continue
+        try:
+            entries.append((os.path.getmtime(entry), get_entry_size(entry), entry))
+        except OSError:
+            continue
+
+    total = sum(size for _, size, _ in entries)
+
+    # least recently used first
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
@@ -1,31 +1,59 @@
 import os
+import json
+import hashlib
+import weakref
 import numpy as np
 from .animation import *
-
-def upper_strings(l):
-    if l is None:
-        return None
-    return list(map(lambda x : x.upper(), l))
-
-def import_bvh(path, log=False):
-    with open(path, "r", encoding='UTF-8') as file:
-        if log:
-            print("bvh file name:", os.path.split(path)[-1])
-        bvh = file.read()
-
-    hierarchy_start = bvh.find("HIERARCHY")
-    hierarchy_end = bvh.find("MOTION")
-
-    hierarchy_section = bvh[hierarchy_start:hierarchy_end]
-    motion_section = bvh[hierarchy_end:]
-
+from .bvh_cache import load_cache, save_cache
+
+def parse_motion(motion_section, channel_cnt):
+    # everything after the Frames / Frame Time header is plain numbers, so convert it in one pass
+    header_end = 0
+    frames, framerate = None, None
+    while (frames is None or framerate is None) and header_end < len(motion_section):
+        line_end = motion_section.find('\n', header_end)
+        if line_end < 0:
+            line_end = len(motion_section)
+        line = motion_section[header_end:line_end].strip()
+        if line.startswith('Frames:'):
+            frames = int(line.split(':')[-1])
+        elif line.startswith('Frame Time:'):
+            framerate = float(line.split(':')[-1])
+        elif len(line) > 0 and line != 'MOTION':
+            break
+        header_end = line_end + 1
+
+    if frames is None or framerate is None:
+        raise ValueError("Invalid MOTION header: 'Frames:' or 'Frame Time:' is missing")
+
+    body = motion_section[header_end:].strip()
+
+    # values per line, counted on the bytes at once; blank lines between rows are skipped
+    data = np.frombuffer(body.encode('UTF-8'), dtype=np.uint8)
+    solid = data > ord(' ')
+    tokens = np.flatnonzero(solid & ~np.concatenate(([False], solid[:-1])))
+    widths = np.bincount(np.searchsorted(np.flatnonzero(data == ord('\n')), tokens))
+    widths = widths[widths > 0]
+    if np.any(widths != channel_cnt):
+        columns = int(widths[np.argmax(widths != channel_cnt)])
+        raise ValueError(f"Channel count mismatch: HIERARCHY declares {channel_cnt} channels, found {columns} columns")
+    if len(widths) != frames:
+        raise ValueError(f"Frame count mismatch: header declares {frames} frames, found {len(widths)} rows")
+
+    motion = np.fromstring(body, dtype=np.float32, sep=' ') if len(body) > 0 else np.empty(0, dtype=np.float32)
+    if motion.size != frames * channel_cnt:
+        raise ValueError(f"Motion data size mismatch: expected {frames * channel_cnt} values, found {motion.size}")
+    motion = motion.reshape(frames, channel_cnt)
+
+    return motion, frames, framerate
+
+
+def parse_hierarchy(hierarchy_section):
     parts = {}
     namestack = []
     roots = []
     names = []
     site_cnt = 0
-    joint_cnt = 0
-    offset_dist_sum = 0
 
     for line in hierarchy_section.split('\n'):
         if len(line.strip()) == 0:
@@ -39,7 +67,6 @@ def import_bvh(path, log=False):
             namestack.append(args[0])
             if prefix == 'ROOT':
                 roots.append(args[0])
-            joint_cnt += 1
             names.append(args[0])
 
         elif prefix == 'End':
@@ -49,9 +76,7 @@ def import_bvh(path, log=False):
             site_cnt += 1
 
         elif prefix == 'OFFSET':
-            offset = glm.vec3(list(map(float, args)))
-            parts[namestack[-1]]['offset'] = offset
-            offset_dist_sum += glm.l2Norm(offset)
+            parts[namestack[-1]]['offset'] = list(map(float, args))
 
         elif prefix == 'CHANNELS':
             parts[namestack[-1]]['channels'] = args[1:]
@@ -61,53 +86,80 @@ def import_bvh(path, log=False):
             if(len(namestack) > 0):
                 parts[namestack[-1]]['children'].append(curname)
                 parts[curname]['parent'] = namestack[-1]
-    
-    objects = {}
 
-    def construct(partname):
-        part = parts[partname]
-        parentname = part['parent']
-        name = f'{part["parent"]}-{partname}'
+    return parts, roots, names
 
-        objects[partname] = GLSkeleton(
-            name= name,
-            parent= objects.get(parentname),
-            offset=parts[partname]['offset'],
-            channels= upper_strings(part.get('channels')),
-            thickness = offset_dist_sum / (len(parts)-len(roots)) / 3,
-            enable_mesh= partname not in roots
-        )
 
-        for childname in part['children']:
-            construct(childname)
+def parse_bvh(path):
+    with open(path, "r", encoding='UTF-8') as file:
+        bvh = file.read()
 
-    for root in roots:
-        construct(root)
+    hierarchy_start = bvh.find("HIERARCHY")
+    hierarchy_end = bvh.find("MOTION")
 
-    motion_section_splitted = motion_section.split('\n')
+    parts, roots, names = parse_hierarchy(bvh[hierarchy_start:hierarchy_end])
 
-    motion = []
+    channel_cnt = sum(len(part.get('channels', [])) for part in parts.values())
+    motion, frames, framerate = parse_motion(bvh[hierarchy_end:], channel_cnt)
 
-    for line in motion_section_splitted[3:]:
-        if len(line.strip()) == 0:
-            continue
-        motion.append(list(map(float, line.strip().split())))
+    hierarchy = {
+        'parts': parts,
+        'roots': roots,
+        'names': names,
+        'frames': frames,
+        'framerate': framerate,
+    }
+    return hierarchy, motion
+
+
+# clips with identical hierarchies share one topology
+_topologies = weakref.WeakValueDictionary()
 
-    object_keys = list(objects.keys())
-    object_values = list(objects.values())
-    frames = int(motion_section_splitted[1].split(':')[-1])
-    framerate = float(motion_section_splitted[2].split(':')[-1])
+def get_topology(parts, roots):
+    key = hashlib.sha1(json.dumps([parts, roots]).encode('UTF-8')).hexdigest()
+    topology = _topologies.get(key)
+    if topology is None:
+        topology = build_topology(parts, roots)
+        _topologies[key] = topology
+    return topology
+
+
+def import_bvh(path, log=False, use_cache=True, progress=None):
+    # progress(fraction) is called between stages
+    report = progress or (lambda fraction: None)
+    if log:
+        print("bvh file name:", os.path.split(path)[-1])
+
+    cached = load_cache(path) if use_cache else None
+    if cached is not None:
+        hierarchy, motion = cached
+        if log:
+            print("Loaded from cache")
+    else:
+        report(0.05)
+        hierarchy, motion = parse_bvh(path)
+        report(0.8)
+        if use_cache:
+            save_cache(path, hierarchy, motion)
+
+    parts = hierarchy['parts']
+    roots = hierarchy['roots']
+    names = hierarchy['names']
+    frames = hierarchy['frames']
+    framerate = hierarchy['framerate']
+
+    topology = get_topology(parts, roots)
 
     if log:
         print("Number of frames:", frames)
         print("fps:", round(1 / framerate, 2))
-        print("Number of joints:", joint_cnt)
+        print("Number of joints:", len(names))
         print("List of all joint names:", names)
 
     return GLAnimationInterpolated(
-        skeletons= object_values,
-        roots= [object_keys.index(element) for element in roots],
-        motion= np.array(motion),
+        topology= topology,
+        motion= motion,
         frames= frames,
-        framerate= framerate
+        framerate= framerate,
+        name= os.path.split(path)[-1]
     )
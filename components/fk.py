@@ -0,0 +1,216 @@
+import numpy as np
+from collections import OrderedDict
+
+from .skeleton import CHANNEL_POSITION
+
+# Batched forward kinematics on a SkeletonTopology.
+# Matrices are row-major (..., 4, 4) float32 arrays; leading dimensions are frames.
+
+
+def rotation_matrices(axis, degrees):
+    theta = np.radians(degrees, dtype=np.float32)
+    c, s = np.cos(theta), np.sin(theta)
+
+    m = np.zeros(theta.shape + (4, 4), dtype=np.float32)
+    m[..., 3, 3] = 1
+    m[..., axis, axis] = 1
+
+    # cyclic (a, b) is (y, z) for x, (z, x) for y and (x, y) for z
+    a, b = (axis+1) % 3, (axis+2) % 3
+    m[..., a, a] = c
+    m[..., a, b] = -s
+    m[..., b, a] = s
+    m[..., b, b] = c
+    return m
+
+
+def translation_matrices(axis, values):
+    values = np.asarray(values, dtype=np.float32)
+    m = np.zeros(values.shape + (4, 4), dtype=np.float32)
+    m[..., [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    m[..., axis, 3] = values
+    return m
+
+
+def local_transforms(topology, channel_values, fix_origin=False):
+    # channel_values: (..., C) -> (..., J, 4, 4) offset * channel transforms of every joint
+    channel_values = np.asarray(channel_values, dtype=np.float32)
+    batch = channel_values.shape[:-1]
+
+    local = np.zeros(batch + (topology.joint_cnt, 4, 4), dtype=np.float32)
+    local[..., [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    local[..., :3, 3] = topology.offsets
+
+    # channel layout is compiled once in SkeletonTopology.compile_channels
+    for channel_type, axis, joints, columns in topology.channel_ops:
+        if channel_type == CHANNEL_POSITION:
+            if fix_origin:
+                continue
+            m = translation_matrices(axis, channel_values[..., columns])
+        else:
+            m = rotation_matrices(axis, channel_values[..., columns])
+        local[..., joints, :, :] = local[..., joints, :, :] @ m
+
+    return local
+
+
+def global_transforms(topology, local):
+    # joints of the same depth only depend on shallower ones, so each level is one matmul
+    world = np.empty_like(local)
+    for level in topology.levels:
+        parents = topology.parents[level]
+        if parents[0] < 0:
+            world[..., level, :, :] = local[..., level, :, :]
+        else:
+            world[..., level, :, :] = world[..., parents, :, :] @ local[..., level, :, :]
+    return world
+
+
+def forward_kinematics(topology, channel_values, fix_origin=False):
+    return global_transforms(topology, local_transforms(topology, channel_values, fix_origin))
+
+
+def bone_transforms(topology, world):
+    # a bone hangs from the joint of its parent; roots stay at the origin
+    bones = np.zeros_like(world)
+    bones[..., [0, 1, 2, 3], [0, 1, 2, 3]] = 1
+    linked = topology.parents >= 0
+    bones[..., linked, :, :] = world[..., topology.parents[linked], :, :]
+    return bones
+
+
+def matrix_quaternions(m):
+    # rotation part of (..., 4, 4) matrices -> (..., 4) unit quaternions stored as (w, x, y, z), w >= 0.
+    # Shepperd's method: 4 * q_a * q_b of every pair is a sum or difference of matrix entries; the
+    # row of the largest component is divided by it, so nothing small is divided by near 180 degrees
+    m = np.asarray(m, dtype=np.float32)
+    m00, m11, m22 = m[..., 0, 0], m[..., 1, 1], m[..., 2, 2]
+    products = np.empty(m.shape[:-2] + (4, 4), dtype=np.float32)
+    products[..., 0, 0] = 1 + m00 + m11 + m22
+    products[..., 1, 1] = 1 + m00 - m11 - m22
+    products[..., 2, 2] = 1 - m00 + m11 - m22
+    products[..., 3, 3] = 1 - m00 - m11 + m22
+    products[..., 0, 1] = products[..., 1, 0] = m[..., 2, 1] - m[..., 1, 2]
+    products[..., 0, 2] = products[..., 2, 0] = m[..., 0, 2] - m[..., 2, 0]
+    products[..., 0, 3] = products[..., 3, 0] = m[..., 1, 0] - m[..., 0, 1]
+    products[..., 1, 2] = products[..., 2, 1] = m[..., 0, 1] + m[..., 1, 0]
+    products[..., 1, 3] = products[..., 3, 1] = m[..., 0, 2] + m[..., 2, 0]
+    products[..., 2, 3] = products[..., 3, 2] = m[..., 1, 2] + m[..., 2, 1]
+
+    largest = np.argmax(np.diagonal(products, axis1=-2, axis2=-1), axis=-1)
+    row = np.take_along_axis(products, largest[..., None, None], axis=-2)[..., 0, :]
+    q = row / (2 * np.sqrt(np.take_along_axis(row, largest[..., None], axis=-1)))
+    q = np.where(q[..., :1] < 0, -q, q)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quaternion_slerp(q0, q1, t):
+    dot = np.sum(q0 * q1, axis=-1, keepdims=True)
+
+    # take the short way around
+    q1 = np.where(dot < 0, -q1, q1)
+    dot = np.abs(dot)
+
+    # nearly parallel quaternions fall back to a normalized lerp
+    linear = dot > 0.9995
+    theta = np.arccos(np.clip(dot, -1, 1))
+    sin_theta = np.where(linear, 1, np.sin(theta))
+    w0 = np.where(linear, 1 - t, np.sin((1 - t) * theta) / sin_theta)
+    w1 = np.where(linear, t, np.sin(t * theta) / sin_theta)
+
+    q = w0 * q0 + w1 * q1
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def quaternion_matrices(q):
+    w, x, y, z = np.moveaxis(q, -1, 0)
+    m = np.zeros(q.shape[:-1] + (4, 4), dtype=np.float32)
+    m[..., 0, 0] = 1 - 2*(y*y + z*z)
+    m[..., 0, 1] = 2*(x*y - z*w)
+    m[..., 0, 2] = 2*(x*z + y*w)
+    m[..., 1, 0] = 2*(x*y + z*w)
+    m[..., 1, 1] = 1 - 2*(x*x + z*z)
+    m[..., 1, 2] = 2*(y*z - x*w)
+    m[..., 2, 0] = 2*(x*z - y*w)
+    m[..., 2, 1] = 2*(y*z + x*w)
+    m[..., 2, 2] = 1 - 2*(x*x + y*y)
+    m[..., 3, 3] = 1
+    return m
+
+
+def interpolated_local_transforms(topology, a, b, t, fix_origin=False):
+    # slerp of joint rotations between two frames; position channels are lerped
+    # and applied before the rotation (see SkeletonTopology.positions_first)
+    rotations = local_transforms(topology, np.stack([a, b]), fix_origin=True)
+    q = matrix_quaternions(rotations)
+    q = quaternion_slerp(q[0], q[1], np.float32(t))
+
+    local = quaternion_matrices(q)
+    local[..., :3, 3] = topology.offsets
+
+    if not fix_origin:
+        a = np.asarray(a, dtype=np.float32)
+        b = np.asarray(b, dtype=np.float32)
+        for channel_type, axis, joints, columns in topology.channel_ops:
+            if channel_type == CHANNEL_POSITION:
+                local[..., joints, axis, 3] += a[..., columns] + t * (b[..., columns] - a[..., columns])
+
+    return local
+
+
+class BakedTransforms:
+    # World transforms of every joint for every frame, (F, J, 4, 4) float32.
+    # Frames are computed in chunks of chunk_frames, for either fix_origin setting;
+    # both share max_bytes, and past it only the most recently used chunks are kept.
+    def __init__(self, topology, motion, chunk_frames=256, max_bytes=512 << 20):
+        self.topology = topology
+        self.motion = motion
+        self.frames = len(motion)
+        self.chunk_frames = max(1, chunk_frames)
+
+        frame_bytes = topology.joint_cnt * 16 * np.dtype(np.float32).itemsize
+        self.max_chunks = max(1, max_bytes // (frame_bytes * self.chunk_frames))
+        self.chunk_cnt = (self.frames + self.chunk_frames - 1) // self.chunk_frames
+        self.chunks = OrderedDict()     # (fix_origin, chunk) -> transforms
+
+    def fill(self, fix_origin=False, report=None):
+        # bake the whole clip up front if it fits; report(fraction) is called between chunks
+        if self.chunk_cnt > self.max_chunks:
+            return
+        for chunk in range(self.chunk_cnt):
+            if report is not None:
+                report(chunk / self.chunk_cnt)
+            self.get_chunk(chunk, fix_origin)
+
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self.chunks.values())
+
+    def get_chunk(self, chunk, fix_origin=False):
+        key = (fix_origin, chunk)
+        transforms = self.chunks.get(key)
+        if transforms is not None:
+            self.chunks.move_to_end(key)
+            return transforms
+
+        s = chunk * self.chunk_frames
+        e = min(s + self.chunk_frames, self.frames)
+        transforms = forward_kinematics(self.topology, self.motion[s:e], fix_origin)
+
+        self.chunks[key] = transforms
+        while len(self.chunks) > self.max_chunks:
+            self.chunks.popitem(last=False)
+        return transforms
+
+    def get(self, frame, fix_origin=False):
+        chunk, index = divmod(frame, self.chunk_frames)
+        return self.get_chunk(chunk, fix_origin)[index]
+
+    def get_blended(self, frame, t, fix_origin=False):
+        # world transforms between frame and the next: rotations are slerped, positions lerped
+        a = self.get(frame, fix_origin)
+        b = self.get((frame+1) % self.frames, fix_origin)
+        q = quaternion_slerp(matrix_quaternions(a), matrix_quaternions(b), np.float32(t))
+
+        world = quaternion_matrices(q)
+        world[..., :3, 3] = a[..., :3, 3] + np.float32(t) * (b[..., :3, 3] - a[..., :3, 3])
+        return world
@@ -22,34 +22,35 @@ class Grid(GLObject):
         super().__init__(
             mesh=GLMesh(
                 vertices= vertices,
-                frame = glm.array(glm.uint32, *[i for i in range(len(vertices))])
+                frame = glm.array(glm.uint32, *[i for i in range(len(vertices))]),
+                name = 'grid',
             )
         )
 
 
+def AxisLine():
+    # unit segment along x; the three axes share its geometry and differ only in shape transform
+    return GLMesh(
+        vertices = glm.array(glm.float32,
+             1.0, 0.0, 0.0,
+            -1.0, 0.0, 0.0,
+        ),
+        frame = glm.array(glm.uint32, 0, 1),
+        name = 'axis',
+    )
+
+
 class Axis:
     def __init__(self, scale=10):
-        self.x = GLObject(mesh=GLMesh(
-            vertices = glm.array(glm.float32,    
-                 scale, 0.0, 0.0,
-                -scale, 0.0, 0.0,
-            ),
-            frame = glm.array(glm.uint32, 0, 1)
-        ))
-        self.y = GLObject(mesh=GLMesh(
-            vertices = glm.array(glm.float32,    
-                0.0, 0.0,  scale,
-                0.0, 0.0, -scale,
-            ),
-            frame = glm.array(glm.uint32, 0, 1)
-        ))
-        self.z = GLObject(mesh=GLMesh(
-            vertices = glm.array(glm.float32,    
-                0.0,    0.0, 0.0,
-                0.0,  scale, 0.0,
-            ),
-            frame = glm.array(glm.uint32, 0, 1)
-        ))
+        self.x = GLObject(mesh=AxisLine(),
+            shape_transform = glm.scale(glm.vec3(scale)),
+        )
+        self.y = GLObject(mesh=AxisLine(),
+            shape_transform = glm.rotate(glm.radians(90), glm.vec3(0, 1, 0)) * glm.scale(glm.vec3(scale)),
+        )
+        self.z = GLObject(mesh=AxisLine(),
+            shape_transform = glm.translate(glm.vec3(0, scale/2, 0)) * glm.rotate(glm.radians(90), glm.vec3(0, 0, 1)) * glm.scale(glm.vec3(scale/2)),
+        )
 
     def prepare(self):
         self.x.prepare()
@@ -58,8 +59,6 @@ class Axis:
     
     def Draw(self, VP, uniform_locs, ignore_light, mode):
         glUniform1i(uniform_locs['ignore_light'], 1)
-        glUniform1i(uniform_locs['useDiffuseMap'], 0)
-        glUniform1i(uniform_locs['useNormalMap'], 0)
 
         axises = [self.x, self.y, self.z]
         colors = [(1, 0, 0), (0, 1, 0), (0, 0, 1)]
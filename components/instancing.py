@@ -0,0 +1,100 @@
+from .objects import *
+
+# per-instance attributes: model matrix (locations 3-6, one column each) and color (location 7)
+INSTANCE_MODEL_LOCATION = 3
+INSTANCE_COLOR_LOCATION = 7
+INSTANCE_FLOATS = 16 + 3
+
+
+class GLInstancedMesh:
+    # Draws many copies of one mesh with per-instance model matrices and colors,
+    # one draw call per material range plus one for the wireframe.
+    def __init__(self, mesh):
+        self.mesh = mesh
+        # the instance attributes are set on the mesh's VAOs, which can not be shared
+        mesh.shared = False
+        self.instance_buffer = None
+        self.instance_data = np.zeros((0, INSTANCE_FLOATS), dtype=np.float32)
+
+    def prepare(self):
+        mesh = self.mesh
+        if mesh.vao_faces_list is None and mesh.vao_frame is None:
+            mesh.prepare()
+
+        self.instance_buffer = gen_buffer(self)
+
+        vaos = list(mesh.vao_faces_list or [])
+        if mesh.vao_frame is not None:
+            vaos.append(mesh.vao_frame)
+
+        stride = INSTANCE_FLOATS * glm.sizeof(glm.float32)
+        for vao in vaos:
+            glBindVertexArray(vao)
+            glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+
+            for column in range(4):
+                location = INSTANCE_MODEL_LOCATION + column
+                glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(4*column*glm.sizeof(glm.float32)))
+                glEnableVertexAttribArray(location)
+                glVertexAttribDivisor(location, 1)
+
+            glVertexAttribPointer(INSTANCE_COLOR_LOCATION, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(16*glm.sizeof(glm.float32)))
+            glEnableVertexAttribArray(INSTANCE_COLOR_LOCATION)
+            glVertexAttribDivisor(INSTANCE_COLOR_LOCATION, 1)
+
+        glBindVertexArray(0)
+
+    @property
+    def name(self):
+        return self.mesh.name
+
+    def release(self):
+        gpu_resources.release(self)
+        self.instance_buffer = None
+        self.mesh.release()
+
+    def upload(self, models, colors):
+        # models: (N, 4, 4) row-major, stored column by column as the shader expects
+        count = len(models)
+        if len(self.instance_data) < count:
+            self.instance_data = np.empty((count, INSTANCE_FLOATS), dtype=np.float32)
+        data = self.instance_data[:count]
+        data[:, :16] = np.transpose(models, (0, 2, 1)).reshape(count, 16)
+        data[:, 16:] = colors
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
+        # orphan the previous storage so the driver does not wait for draws still using it
+        buffer_data(GL_ARRAY_BUFFER, self.instance_buffer, data.nbytes, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes, data)
+
+    def Draw(self, models, colors, VP, uniform_locs, ignore_light, mode):
+        count = len(models)
+        if count == 0:
+            return
+        if self.instance_buffer is None:
+            self.prepare()
+
+        mesh = self.mesh
+        self.upload(models, colors)
+
+        # VP comes from the Frame uniform block
+        glUniform1i(uniform_locs['useInstancing'], 1)
+
+        if mesh.vao_faces_list is not None and mode & DRAW_MESH:
+            glUniform1i(uniform_locs['ignore_light'], ignore_light)
+
+            for i in range(len(mesh.vao_faces_list)):
+                glBindVertexArray(mesh.vao_faces_list[i])
+
+                mtl = mesh.materials[i][0]
+                (mtl if mtl is not None else default_material).apply()
+
+                glDrawElementsInstanced(GL_TRIANGLES, mesh.face_lengths[i], GL_UNSIGNED_INT, None, count)
+
+        if mesh.vao_frame is not None and mode & DRAW_WIREFRAME:
+            glUniform1i(uniform_locs['ignore_light'], 1)
+            default_material.apply()
+            glBindVertexArray(mesh.vao_frame)
+            glDrawElementsInstanced(GL_LINES, len(mesh.frame), GL_UNSIGNED_INT, None, count)
+
+        glUniform1i(uniform_locs['useInstancing'], 0)
@@ -0,0 +1,122 @@
+import os
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_QUEUED = 'queued'
+JOB_LOADING = 'loading'
+JOB_UPLOADING = 'uploading'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+JOB_FINISHED = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class LoadJob:
+    def __init__(self, path, load, upload, discard=None):
+        self.path = path
+        self.name = os.path.basename(path)
+        self.load = load        # load(report) -> data, runs on the pool without GL
+        self.upload = upload    # upload(data), runs on the GL thread
+        self.discard = discard  # discard(result), runs on the GL thread if the job ends without upload;
+                                # result is None if loading did not finish
+
+        self.state = JOB_QUEUED
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.future = None
+
+    def report(self, progress):
+        # passed to the importer as its progress callback, which makes it a cancellation point too
+        if self.cancelled:
+            raise LoadCancelled()
+        self.progress = progress
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None and self.future.cancel():
+            self.state = JOB_CANCELLED
+
+
+class LoaderService:
+    # Loads files on a thread pool; only the GPU upload of each result is queued
+    # to the GL thread through exec_queue.
+    def __init__(self, exec_queue, max_workers=4):
+        self.exec_queue = exec_queue
+        self.max_workers = max_workers
+        self.pool = None
+        self.jobs = []
+        self.lock = Lock()
+
+    def submit(self, path, load, upload, discard=None):
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='loader')
+
+        job = LoadJob(path, load, upload, discard)
+        with self.lock:
+            self.jobs.append(job)
+        job.future = self.pool.submit(self.run, job)
+        return job
+
+    def run(self, job):
+        if job.cancelled:
+            job.state = JOB_CANCELLED
+            self.put_discard(job)
+            return
+
+        job.state = JOB_LOADING
+        try:
+            job.result = job.load(job.report)
+        except LoadCancelled:
+            job.state = JOB_CANCELLED
+            self.put_discard(job)
+            return
+        except Exception as e:
+            job.state = JOB_FAILED
+            job.error = e
+            print("Failed to load:", job.path, e)
+            self.put_discard(job)
+            return
+
+        job.state = JOB_UPLOADING
+        self.exec_queue.put(lambda job=job: self.finish(job))
+
+    def put_discard(self, job):
+        if job.discard is not None:
+            self.exec_queue.put(lambda job=job: job.discard(None))
+
+    def finish(self, job):
+        if job.cancelled:
+            job.state = JOB_CANCELLED
+            if job.discard is not None:
+                job.discard(job.result)
+        else:
+            try:
+                job.upload(job.result)
+                job.state = JOB_DONE
+                job.progress = 1.0
+            except Exception as e:
+                job.state = JOB_FAILED
+                job.error = e
+                print("Failed to load:", job.path, e)
+                if job.discard is not None:
+                    job.discard(job.result)
+        job.result = None
+
+    def get_jobs(self):
+        with self.lock:
+            return list(self.jobs)
+
+    def cancel_all(self):
+        for job in self.get_jobs():
+            job.cancel()
+
+    def clear_finished(self):
+        with self.lock:
+            self.jobs = [job for job in self.jobs if job.state not in JOB_FINISHED]
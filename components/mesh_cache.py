@@ -0,0 +1,159 @@
+import os
+import threading
+import json
+import struct
+import hashlib
+import numpy as np
+
+# Imported OBJ meshes are cached next to the source file as
+#   <dir>/.meshcache/<filename>.<key>.mesh
+# where <key> is a hash of the file contents. An entry is a small JSON header followed by
+# the raw arrays, each aligned so it can be memory-mapped and uploaded without a copy.
+# The header lists the .mtl files and textures the mesh was built from; an entry is
+# stale as soon as one of them changes.
+CACHE_ENABLED = True
+CACHE_DIRNAME = '.meshcache'
+CACHE_MAX_BYTES = 4 << 30  # per cache directory
+
+MAGIC = b'GLMESH01'
+ALIGNMENT = 64
+
+
+def align(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()[:16]
+
+
+def get_cache_dir(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIRNAME)
+
+
+def get_entry_path(path, key=None):
+    return os.path.join(get_cache_dir(path), f'{os.path.basename(path)}.{key or file_hash(path)}.mesh')
+
+
+def file_state(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return [os.path.abspath(path), None, None]
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def load_mesh_cache(path):
+    # -> (header, {name: read-only array mapped from the entry}) or None
+    if not CACHE_ENABLED:
+        return None
+
+    try:
+        entry = get_entry_path(path)
+        if not os.path.isfile(entry):
+            return None
+
+        with open(entry, 'rb') as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None
+            header_size, = struct.unpack('<Q', file.read(8))
+            header = json.loads(file.read(header_size).decode('UTF-8'))
+
+        for dependency in header['dependencies']:
+            if file_state(dependency[0]) != dependency:
+                return None
+
+        data = np.memmap(entry, dtype=np.uint8, mode='r')
+        start = align(len(MAGIC) + 8 + header_size)
+        arrays = {}
+        for name, (offset, dtype, shape) in header['arrays'].items():
+            dtype = np.dtype(dtype)
+            nbytes = int(np.prod(shape)) * dtype.itemsize
+            arrays[name] = data[start+offset:start+offset+nbytes].view(dtype).reshape(shape)
+
+        # last access time drives eviction
+        os.utime(entry)
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return header, arrays
+
+
+def save_mesh_cache(path, header, arrays, dependencies=[]):
+    if not CACHE_ENABLED:
+        return
+
+    header = dict(header)
+    header['dependencies'] = [file_state(dependency) for dependency in dependencies]
+    header['arrays'] = {}
+
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = [offset, array.dtype.str, list(array.shape)]
+        offset += align(array.nbytes)
+    header_bytes = json.dumps(header).encode('UTF-8')
+
+    try:
+        entry = get_entry_path(path)
+        clear_mesh_cache(path)
+        os.makedirs(get_cache_dir(path), exist_ok=True)
+
+        tmp_entry = f'{entry}.tmp{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_entry, 'wb') as file:
+            file.write(MAGIC)
+            file.write(struct.pack('<Q', len(header_bytes)))
+            file.write(header_bytes)
+            file.write(bytes(align(file.tell()) - file.tell()))
+            for array in arrays.values():
+                array = np.ascontiguousarray(array)
+                file.write(array.tobytes())
+                file.write(bytes(align(array.nbytes) - array.nbytes))
+
+        os.replace(tmp_entry, entry)
+    except OSError as e:
+        print("Failed to write mesh cache:", e)
+        return
+
+    evict_mesh_cache(get_cache_dir(path))
+
+
+def clear_mesh_cache(path):
+    # remove every entry of this file, including stale ones from older versions of it
+    cache_dir = get_cache_dir(path)
+    if not os.path.isdir(cache_dir):
+        return
+
+    prefix = f'{os.path.basename(path)}.'
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name.endswith('.mesh') and len(name) == len(prefix) + 16 + len('.mesh'):
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+
+def evict_mesh_cache(cache_dir, max_bytes=None):
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+
+    entries = []
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        if name.endswith('.mesh') and os.path.isfile(entry):
+            entries.append((os.path.getmtime(entry), os.path.getsize(entry), entry))
+
+    total = sum(size for _, size, _ in entries)
+
+    # least recently used first
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(entry)
+        except OSError:
+            continue
+        total -= size
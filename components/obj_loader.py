@@ -1,9 +1,14 @@
 import os
-from PIL import Image
+import multiprocessing
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory, resource_tracker
 from .objects import *
+from .mesh_cache import load_mesh_cache, save_mesh_cache
 
 
-default_vertex = [0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
+default_vertex = [0.0, 0.0, 0.0]
 default_normal = [0.0, 0.0, 0.0]
 default_texture = [0.0, 0.0]
 
@@ -53,6 +58,30 @@ def decode_l(args, pc_length):
     return res
 
 
+def load_material_images(material):
+    # decoded in the background, uploaded by GLMaterial.prepare on the GL thread
+    for path in (material.diffuse_map_path, material.normal_map_path):
+        if path is not None:
+            texture_manager.prefetch(path)
+
+
+def cancel_material_images(material):
+    # the material will not be prepared, see TextureManager.cancel
+    for path in (material.diffuse_map_path, material.normal_map_path):
+        if path is not None:
+            texture_manager.cancel(path)
+
+
+def discard_obj(Object):
+    # a loaded object that will not be added to the scene; None if loading did not finish
+    if Object is None or Object.mesh is None or Object.mesh.materials is None:
+        return
+    materials = {id(mtl): mtl for mtl, _ in Object.mesh.materials if mtl is not None}
+    for material in materials.values():
+        if material.block_index is None:
+            cancel_material_images(material)
+
+
 def import_mtl(mtl_file_path):
     materials = {}
     current_material = None
@@ -78,116 +107,53 @@ def import_mtl(mtl_file_path):
                     current_material.shininess = float(parts[1])
 
                 elif parts[0] == 'map_Kd':
-                    # create texture
-                    texture1 = glGenTextures(1)             # create texture object
-                    glActiveTexture(GL_TEXTURE0)
-                    glBindTexture(GL_TEXTURE_2D, texture1)  # activate texture1 as GL_TEXTURE_2D
-
-                    # set texture filtering parameters - skip at this moment
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-
-                    try:
-                        img_math = get_absolute_path(os.path.dirname(mtl_file_path), parts[1])
-                        extension = parts[1].split('.')[-1]
-                        img = Image.open(img_math)
-                        img = img.transpose(Image.FLIP_TOP_BOTTOM)
-
-                        if extension == 'jpg':
-                            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, img.width, img.height, 0, GL_RGB, GL_UNSIGNED_BYTE, img.tobytes())
-                        elif extension == 'png':
-                            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, img.width, img.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img.tobytes())
-                        
-                        current_material.disffuse_map = texture1
-                        print("Loaded", parts[1])
-                    except:
-                        print("Failed to load diffuse map:", img_math)
+                    current_material.diffuse_map_path = get_absolute_path(os.path.dirname(mtl_file_path), parts[1])
 
                 elif parts[0] == 'map_Bump':
-                    # create texture
-                    texture1 = glGenTextures(1)             # create texture object
-                    glActiveTexture(GL_TEXTURE1)
-                    glBindTexture(GL_TEXTURE_2D, texture1)  # activate texture1 as GL_TEXTURE_2D
-
-                    # set texture filtering parameters - skip at this moment
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
-                    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
-
-                    try:
-                        img_math = get_absolute_path(os.path.dirname(mtl_file_path), parts[1])
-                        extension = parts[1].split('.')[-1]
-                        img = Image.open(img_math)
-                        img = img.transpose(Image.FLIP_TOP_BOTTOM)
-
-                        if extension == 'jpg':
-                            img = img.convert('RGB')
-                            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, img.width, img.height, 0, GL_RGB, GL_UNSIGNED_BYTE, img.tobytes())
-                        elif extension == 'png':
-                            img = img.convert('RGBA')
-                            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, img.width, img.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img.tobytes())
-                        
-                        current_material.normal_map = texture1
-                        print("Loaded", parts[1])
-                    except Exception as e:
-                        print(e)
-                        print("Failed to load normal map:", img_math)
+                    current_material.normal_map_path = get_absolute_path(os.path.dirname(mtl_file_path), parts[1])
 
 
         if current_material is not None:
             materials[current_material.name] = current_material
 
-    return materials
-
-
-def import_obj(path, log=False, color=[1.0, 1.0, 1.0]):
-    with open(path, "r", encoding='UTF-8') as file:
-        if log:
-            print("Obj file name:", os.path.split(path)[-1])
-        obj = file.read()
+    for material in materials.values():
+        load_material_images(material)
 
+    return materials
 
-    global default_vertex
-    default_vertex = [0, 0, 0]
 
+def parse_obj_lines(obj):
+    # line by line parser, used when parse_obj can not handle the file
     vertices = [default_vertex]
     textures = [default_texture]
     normals = [default_normal]
     faces, lines, frame = [], [], []
-
-    materials = {}
-    usemtl = []
-
+    events = []
     face_cnt = 0
-    tri_cnt = 0
 
     for line in obj.split('\n'):
         if len(line.strip()) == 0:
             continue
         prefix, args = (line+' ').split(' ', maxsplit=1)
-        args = args.strip().split(' ')
+        args = args.strip().split()
         
         if prefix == 'mtllib':
-            mtpath = get_absolute_path(os.path.dirname(path), ' '.join(args))
-            try:
-                materials = import_mtl(mtpath)
-            except:
-                print('Failed to load:', mtpath)
+            events.append(('mtllib', ' '.join(args), None))
 
         if prefix == 'usemtl':
-            usemtl.append((len(faces), materials.get(args[0])))
+            events.append(('usemtl', args[0], len(faces)))
         
         elif prefix == 'v':
-            vertices.append(list(map(float, args)))
+            vertices.append(list(map(float, args[:3])))
 
         elif prefix == 'vn':
-            normals.append(list(map(float, args)))
+            normals.append(list(map(float, args[:3])))
         
         elif prefix == 'vt':
             textures.append(list(map(float, args[:2])))
 
         elif prefix == 'f':
             face_cnt += 1
-            tri_cnt += len(args)-2
             face_vertices, face_frame = decode_f(args, len(vertices), len(textures), len(normals))
             faces.extend(face_vertices)
             frame.extend(face_frame)
@@ -195,21 +161,611 @@ def import_obj(path, log=False, color=[1.0, 1.0, 1.0]):
         elif prefix == 'l':
             lines.extend(decode_l(args, len(vertices)))
 
+    return {
+        'vertices': np.array(vertices, dtype=np.float32).reshape(-1),
+        'textures': np.array(textures, dtype=np.float32).reshape(-1),
+        'normals': np.array(normals, dtype=np.float32).reshape(-1),
+        'faces': np.array(faces, dtype=np.uint32).reshape(-1),
+        'lines': np.array(lines, dtype=np.uint32),
+        'frame': np.array(frame, dtype=np.uint32),
+        'events': events,
+        'face_cnt': face_cnt,
+    }
+
+
+LINE_OTHER, LINE_V, LINE_VT, LINE_VN, LINE_F, LINE_L, LINE_MTL = range(7)
+
+def classify_lines(data):
+    # data: uint8 array of the file -> start and end offset and kind of every line
+    newlines = np.flatnonzero(data == ord('\n'))
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.concatenate((newlines, [len(data)]))
+
+    # reading past a short line only sees '\n', which never matches a prefix
+    padded = np.concatenate((data, np.frombuffer(b'\n\n\n', dtype=np.uint8)))
+    c0, c1, c2 = padded[starts], padded[starts+1], padded[starts+2]
+    blank1 = (c1 == ord(' ')) | (c1 == ord('\t'))
+    blank2 = (c2 == ord(' ')) | (c2 == ord('\t'))
+
+    kinds = np.full(len(starts), LINE_OTHER, dtype=np.int8)
+    kinds[(c0 == ord('v')) & blank1] = LINE_V
+    kinds[(c0 == ord('v')) & (c1 == ord('t')) & blank2] = LINE_VT
+    kinds[(c0 == ord('v')) & (c1 == ord('n')) & blank2] = LINE_VN
+    kinds[(c0 == ord('f')) & blank1] = LINE_F
+    kinds[(c0 == ord('l')) & blank1] = LINE_L
+    kinds[(c0 == ord('u')) | (c0 == ord('m'))] = LINE_MTL
+    return starts, ends, kinds
+
+
+def join_runs(obj, starts, ends, kinds, kind):
+    # consecutive lines of the same kind are sliced out of the file in one piece, one line per row
+    rows = kinds == kind
+    first = np.flatnonzero(rows & ~np.concatenate(([False], rows[:-1])))
+    last = np.flatnonzero(rows & ~np.concatenate((rows[1:], [False])))
+    return b'\n'.join([obj[starts[f]:ends[l]] for f, l in zip(first, last)])
+
+
+def split_tokens(body):
+    # -> body as bytes, offsets of its newlines and of the first byte of every whitespace separated token
+    data = np.frombuffer(body, dtype=np.uint8)
+    solid = data > ord(' ')
+    tokens = np.flatnonzero(solid & ~np.concatenate(([False], solid[:-1])))
+    return data, np.flatnonzero(data == ord('\n')), tokens
+
+
+def parse_floats(body, prefix, rows, columns):
+    # "<prefix> x y z ..." lines -> (rows, columns); every line must have the same number of values
+    if rows == 0:
+        return np.zeros((0, columns), dtype=np.float32)
+
+    data, newlines, tokens = split_tokens(body)
+    widths = np.bincount(np.searchsorted(newlines, tokens), minlength=rows) - 1
+    width = int(widths[0])
+    if len(widths) != rows or width < columns or np.any(widths != width):
+        raise ValueError("Inconsistent number of values")
+
+    values = np.fromstring(body.replace(prefix, b' '), dtype=np.float32, sep=' ')
+    if values.size != width * rows:
+        raise ValueError("Inconsistent number of values")
+    return values.reshape(rows, width)[:, :columns]
+
+
+MISSING_INDEX = np.iinfo(np.int32).max
+FACE_TABLE = bytes.maketrans(b'f/', b'0 ')
+
+def parse_face_indices(body, rows):
+    # "f a/b/c ..." lines -> (corners, 3) raw indices and the number of corners of every face
+    data, newlines, tokens = split_tokens(body)
+    prefixes = data[tokens] == ord('f')
+    if len(tokens) < 2 or prefixes[1] or np.count_nonzero(prefixes) != rows:
+        raise ValueError("Invalid face indices")
+
+    # every corner has as many fields as the first one
+    slashes = np.flatnonzero(data == ord('/'))
+    fields = np.diff(np.searchsorted(slashes, tokens), append=len(slashes)) + 1
+    width = int(fields[1])
+    if width > 3 or np.any(fields != np.where(prefixes, 1, width)):
+        raise ValueError("Mixed face formats")
+
+    # every face starts with index 0, which OBJ files never use; empty fields become MISSING_INDEX
+    if b'//' in body:
+        body = body.replace(b'//', b'/%d/' % MISSING_INDEX)
+    values = np.fromstring(body.translate(FACE_TABLE), dtype=np.int32, sep=' ')
+
+    separators = np.flatnonzero(values == 0)
+    if len(separators) != rows or (rows > 0 and separators[0] != 0):
+        raise ValueError("Invalid face indices")
+    counts = np.diff(np.append(separators, len(values))) - 1
+    if np.any(counts % width != 0) or np.any(counts == 0):
+        raise ValueError("Mixed face formats")
+
+    indices = values[values != 0].reshape(-1, width)
+    corners = np.zeros((len(indices), 3), dtype=np.int32)
+    corners[:, :width] = indices
+    corners[corners == MISSING_INDEX] = 0
+    return corners, counts // width
+
+
+def triangulate_faces(corners, counts):
+    # fan triangulation and closed edge loops of every face, grouped by corner count, in file order
+    face_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    tri_counts = np.maximum(counts - 2, 0)
+    tri_starts = np.concatenate(([0], np.cumsum(tri_counts)[:-1]))
+
+    triangles = np.empty((int(tri_counts.sum()), 3, 3), dtype=corners.dtype)
+    edges = np.empty((int(counts.sum()), 2), dtype=corners.dtype)
+
+    for count in np.unique(counts):
+        group = np.flatnonzero(counts == count)
+        face = corners[face_starts[group, None] + np.arange(count)]         # (F, count, 3)
+
+        if count >= 3:
+            fan = np.empty((len(group), count-2, 3, 3), dtype=corners.dtype)
+            fan[:, :, 0] = face[:, :1]
+            fan[:, :, 1] = face[:, 1:-1]
+            fan[:, :, 2] = face[:, 2:]
+            triangles[tri_starts[group, None] + np.arange(count-2)] = fan
+
+        loop = np.empty((len(group), count, 2), dtype=corners.dtype)
+        loop[:, :, 0] = face[:, :, 0]
+        loop[:, :-1, 1] = face[:, 1:, 0]
+        loop[:, -1, 1] = face[:, 0, 0]
+        edges[face_starts[group, None] + np.arange(count)] = loop
+
+    return triangles.reshape(-1, 3), edges.reshape(-1)
+
+
+def parse_obj_chunk(obj):
+    # bulk parser: lines are classified on the raw bytes, then every kind is converted with NumPy at once.
+    # Relative indices are resolved against this chunk only and flagged, see stitch_chunks
+    starts, ends, kinds = classify_lines(np.frombuffer(obj, dtype=np.uint8))
+
+    v_rows = np.flatnonzero(kinds == LINE_V)
+    vt_rows = np.flatnonzero(kinds == LINE_VT)
+    vn_rows = np.flatnonzero(kinds == LINE_VN)
+    f_rows = np.flatnonzero(kinds == LINE_F)
+
+    vertices = parse_floats(join_runs(obj, starts, ends, kinds, LINE_V), b'v', len(v_rows), 3)
+    textures = parse_floats(join_runs(obj, starts, ends, kinds, LINE_VT), b'vt', len(vt_rows), 2)
+    normals = parse_floats(join_runs(obj, starts, ends, kinds, LINE_VN), b'vn', len(vn_rows), 3)
+
+    if len(f_rows) > 0:
+        corners, counts = parse_face_indices(join_runs(obj, starts, ends, kinds, LINE_F), len(f_rows))
+    else:
+        corners = np.zeros((0, 3), dtype=np.int32)
+        counts = np.zeros(0, dtype=np.int32)
+
+    # relative (negative) indices count back from the last element read before the face
+    relative = corners < 0
+    face_of_corner = np.repeat(np.arange(len(f_rows)), counts)
+    for column, rows in enumerate([v_rows, vt_rows, vn_rows]):
+        if np.any(relative[:, column]):
+            corners[relative[:, column], column] += np.searchsorted(rows, f_rows[face_of_corner[relative[:, column]]])
+
+    # (kind, arguments, faces or vertices read before the line)
+    events = []
+    for i in np.flatnonzero((kinds == LINE_L) | (kinds == LINE_MTL)):
+        line = obj[starts[i]:ends[i]].decode('UTF-8').strip()
+        prefix, args = (line+' ').split(' ', maxsplit=1)
+        args = args.strip().split()
+        if prefix == 'mtllib':
+            events.append(('mtllib', ' '.join(args), None))
+        elif prefix == 'usemtl':
+            events.append(('usemtl', args[0], int(np.searchsorted(f_rows, i))))
+        elif prefix == 'l':
+            events.append(('l', args, int(np.searchsorted(v_rows, i))))
+
+    return {
+        'vertices': vertices,
+        'textures': textures,
+        'normals': normals,
+        'corners': corners,
+        'relative': relative,
+        'counts': counts.astype(np.int32),
+        'events': events,
+    }
+
+
+def stitch_chunks(chunks):
+    # chunks parsed from consecutive parts of one file -> the same result as parse_obj_lines
+    element_cnts = np.array([[len(c['vertices']), len(c['textures']), len(c['normals'])] for c in chunks], dtype=np.int64)
+    bases = np.cumsum(element_cnts, axis=0) - element_cnts + 1   # +1 for the default elements
+    face_bases = np.cumsum([len(c['counts']) for c in chunks]) - [len(c['counts']) for c in chunks]
+
+    corners = np.concatenate([c['corners'] for c in chunks])
+    corners += np.concatenate([c['relative'] * bases[i].astype(np.int32) for i, c in enumerate(chunks)])
+    counts = np.concatenate([c['counts'] for c in chunks])
+
+    if len(counts) > 0:
+        triangles, frame = triangulate_faces(corners, counts)
+    else:
+        triangles = np.zeros((0, 3), dtype=np.int32)
+        frame = np.zeros(0, dtype=np.int32)
+
+    # corners emitted before each face
+    corner_starts = np.concatenate(([0], 3 * np.cumsum(np.maximum(counts - 2, 0))))
+
+    lines = []
+    events = []
+    for i, chunk in enumerate(chunks):
+        for kind, args, position in chunk['events']:
+            if kind == 'usemtl':
+                events.append((kind, args, int(corner_starts[face_bases[i] + position])))
+            elif kind == 'l':
+                lines.extend(decode_l(args, int(bases[i][0]) + position))
+            else:
+                events.append((kind, args, position))
+
+    return {
+        'vertices': np.concatenate([default_vertex] + [c['vertices'].reshape(-1) for c in chunks]).astype(np.float32),
+        'textures': np.concatenate([default_texture] + [c['textures'].reshape(-1) for c in chunks]).astype(np.float32),
+        'normals': np.concatenate([default_normal] + [c['normals'].reshape(-1) for c in chunks]).astype(np.float32),
+        'faces': triangles.astype(np.uint32).reshape(-1),
+        'lines': np.array(lines, dtype=np.uint32),
+        'frame': frame.astype(np.uint32),
+        'events': events,
+        'face_cnt': len(counts),
+    }
+
+
+def parse_obj(obj):
+    return stitch_chunks([parse_obj_chunk(obj)])
+
+
+# Large files are split on line boundaries and parsed by a process pool.
+# Workers hand their arrays back through shared memory instead of pickling them.
+PARSE_WORKERS = None            # None uses every CPU
+PARALLEL_MIN_BYTES = 64 << 20   # smaller files are parsed in this process
+CHUNK_ARRAYS = ['vertices', 'textures', 'normals', 'corners', 'relative', 'counts']
+
+
+def get_parse_pool(workers):
+    # one pool shared by every load, sized by the first; its processes are spawned rather
+    # than forked, since loads run on loader threads of a process that also runs Qt and GL
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
+
+
+def reset_parse_pool(pool):
+    # a worker died; the next load starts a new pool
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is pool:
+            _parse_pool = None
+    pool.shutdown(wait=False)
+
+_parse_pool = None
+_parse_pool_lock = Lock()
+
+
+def split_file(path, count):
+    # byte ranges of about the same size, each ending right after a '\n'
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as file:
+        for i in range(1, count):
+            file.seek(max(size * i // count, bounds[-1]))
+            file.readline()
+            position = file.tell()
+            if position >= size:
+                break
+            if position > bounds[-1]:
+                bounds.append(position)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_obj_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        chunk = parse_obj_chunk(file.read(end - start))
+
+    shared = {'events': chunk['events']}
+    for key in CHUNK_ARRAYS:
+        array = chunk[key]
+        memory = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+        shared[key] = (memory.name, array.dtype.str, array.shape)
+        memory.close()
+    return shared
+
+
+def load_shared(name, dtype, shape):
+    # copy an array out of a worker's shared block and free the block
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=np.dtype(dtype), buffer=memory.buf).copy()
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def parse_obj_parallel(path, workers, on_chunk=None, progress=None):
+    # on_chunk(triangles) streams like parse_obj_streaming: ranges are parsed in parallel
+    # and handed over in file order, so there are more of them to draw from early on
+    count = workers
+    if on_chunk is not None:
+        count = max(workers, -(-os.path.getsize(path) // STREAM_CHUNK_BYTES))
+    ranges = split_file(path, count)
+    if os.name == 'posix':
+        # workers must share our tracker, or theirs would unlink the blocks when they exit
+        resource_tracker.ensure_running()
+
+    elements, counts = preview_elements()
+    chunks, error = [], None
+    pool = get_parse_pool(workers)
+    futures = [pool.submit(parse_obj_range, path, start, end) for start, end in ranges]
+
+    # every range is collected even after an error, so the blocks of the others are freed
+    for i, future in enumerate(futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+
+        chunk = {'events': result['events']}
+        for key in CHUNK_ARRAYS:
+            chunk[key] = load_shared(*result[key])
+        chunks.append(chunk)
+        if error is not None:
+            continue
+
+        try:
+            if on_chunk is not None:
+                stream_preview(chunk, elements, counts, on_chunk)
+            if progress is not None:
+                progress((i+1) / len(ranges))
+        except Exception as e:
+            # cancelled through progress; ranges not started yet are dropped
+            error = e
+            for future in futures:
+                future.cancel()
+
+    if isinstance(error, BrokenProcessPool):
+        reset_parse_pool(pool)
+    if error is not None:
+        raise error
+    return stitch_chunks(chunks)
+
+
+# Streaming mode parses the file in order, one range at a time, and hands the triangles of
+# every range to on_chunk as soon as they are known so they can be drawn while loading.
+STREAM_CHUNK_BYTES = 16 << 20
+
+
+def append_rows(buffer, count, rows):
+    # amortized growth of an (N, k) array, returns the buffer and the new row count
+    if count + len(rows) > len(buffer):
+        grown = np.empty((max(2 * len(buffer), count + len(rows)), buffer.shape[1]), dtype=buffer.dtype)
+        grown[:count] = buffer[:count]
+        buffer = grown
+    buffer[count:count+len(rows)] = rows
+    return buffer, count + len(rows)
+
+
+def preview_triangles(chunk, elements, counts):
+    # (corners, 8) interleaved position, uv and normal of the chunk's triangles, not deduplicated;
+    # triangles pointing past what has been read so far are left out
+    bases = np.array([counts[k] - len(chunk[key]) for k, key in enumerate(['vertices', 'textures', 'normals'])])
+    corners = chunk['corners'] + chunk['relative'] * bases.astype(np.int32)
+    triangles, _ = triangulate_faces(corners, chunk['counts'])
+
+    valid = np.all((triangles < np.array(counts)).reshape(-1, 3, 3), axis=(1, 2))
+    triangles = triangles.reshape(-1, 3, 3)[valid].reshape(-1, 3)
+
+    data = np.empty((len(triangles), 8), dtype=np.float32)
+    data[:, 0:3] = elements[0][triangles[:, 0]]
+    data[:, 3:5] = elements[1][triangles[:, 1]]
+    data[:, 5:8] = elements[2][triangles[:, 2]]
+    return data
+
+
+def preview_elements():
+    # everything read so far, starting with the default elements
+    elements = [np.zeros((1, 3), dtype=np.float32), np.zeros((1, 2), dtype=np.float32), np.zeros((1, 3), dtype=np.float32)]
+    return elements, [1, 1, 1]
+
+
+def stream_preview(chunk, elements, counts, on_chunk):
+    # chunks must come in file order
+    for k, key in enumerate(['vertices', 'textures', 'normals']):
+        elements[k], counts[k] = append_rows(elements[k], counts[k], chunk[key])
+    on_chunk(preview_triangles(chunk, elements, counts))
+
+
+def parse_obj_streaming(path, on_chunk, chunk_bytes=None, progress=None):
+    size = os.path.getsize(path)
+    ranges = split_file(path, max(1, -(-size // (chunk_bytes or STREAM_CHUNK_BYTES))))
+
+    elements, counts = preview_elements()
+    chunks = []
+    with open(path, 'rb') as file:
+        for i, (start, end) in enumerate(ranges):
+            file.seek(start)
+            chunk = parse_obj_chunk(file.read(end - start))
+            chunks.append(chunk)
+            stream_preview(chunk, elements, counts, on_chunk)
+
+            if progress is not None:
+                progress((i+1) / len(ranges))
+
+    # the final mesh is built exactly like a regular load
+    return stitch_chunks(chunks)
+
+
+def material_to_dict(material):
+    return {
+        'name': material.name,
+        'ambient': list(material.ambient),
+        'diffuse': list(material.diffuse),
+        'specular': list(material.specular),
+        'shininess': material.shininess,
+        'diffuse_map_path': material.diffuse_map_path,
+        'normal_map_path': material.normal_map_path,
+    }
+
+
+def material_from_dict(data):
+    material = GLMaterial(
+        name = data['name'],
+        ambient = tuple(data['ambient']),
+        diffuse = tuple(data['diffuse']),
+        specular = tuple(data['specular']),
+        shininess = data['shininess'],
+        diffuse_map_path = data['diffuse_map_path'],
+        normal_map_path = data['normal_map_path'],
+    )
+    load_material_images(material)
+    return material
+
+
+def save_obj_cache(path, mesh, face_cnt, dependencies):
+    # materials are stored once and referenced by index from usemtl
+    materials = []
+    usemtl = []
+    index = {}
+    for offset, material in mesh.usemtl:
+        if material is not None and id(material) not in index:
+            index[id(material)] = len(materials)
+            materials.append(material)
+        usemtl.append([offset, index[id(material)] if material is not None else None])
+
+    header = {
+        'face_cnt': face_cnt,
+        'materials': [material_to_dict(material) for material in materials],
+        'usemtl': usemtl,
+        'key': mesh.get_key(),
+    }
+    bounds = mesh.get_bounds()
+    if bounds is not None:
+        header['bounds'] = [bounds.lo.tolist(), bounds.hi.tolist(), bounds.center.tolist(), bounds.radius]
+
+    arrays = {'vertices': np.asarray(mesh.vertices, dtype=np.float32)}
+    if mesh.materials is not None:
+        arrays['interleaved'], arrays['indices'] = mesh.get_combined()
+    if mesh.lines is not None:
+        arrays['lines'] = np.asarray(mesh.lines, dtype=np.uint32)
+    if mesh.frame is not None:
+        arrays['frame'] = np.asarray(mesh.frame, dtype=np.uint32)
+
+    texture_paths = [path for material in materials for path in (material.diffuse_map_path, material.normal_map_path) if path is not None]
+    save_mesh_cache(path, header, arrays, dependencies + texture_paths)
+
+
+def load_obj_cache(path):
+    cached = load_mesh_cache(path)
+    if cached is None:
+        return None
+    header, arrays = cached
+
+    materials = [material_from_dict(material) for material in header['materials']]
+    usemtl = [(offset, materials[index] if index is not None else None) for offset, index in header['usemtl']]
+
+    mesh = GLMesh(
+        vertices = arrays['vertices'],
+        lines = arrays.get('lines'),
+        frame = arrays.get('frame'),
+        usemtl = usemtl,
+        combined = (arrays['interleaved'], arrays['indices']) if 'indices' in arrays else None,
+        name = os.path.basename(path),
+    )
+    mesh.key = header.get('key')
+    if 'bounds' in header:
+        mesh.bounds = Bounds(*header['bounds'])
+    return mesh, header['face_cnt']
+
+
+def import_obj(path, log=False, color=[1.0, 1.0, 1.0], workers=None, use_cache=True, progress=None, on_chunk=None):
+    # progress(fraction) is called between stages; on_chunk(triangles) enables streaming, see parse_obj_streaming
+    report = progress or (lambda fraction: None)
     if log:
-        print("Number of faces:", face_cnt)
-        print("Number of triangles:", tri_cnt)
-
-    return GLObject(
-        mesh = GLMesh(
-            vertices = glm.array(glm.float32, *np.array(vertices).flatten()),
-            normals = glm.array(glm.float32, *np.array(normals).flatten()),
-            textures = glm.array(glm.float32, *np.array(textures).flatten()),
-            
-            faces = glm.array(glm.uint32, *np.array(faces).flatten()),
-            lines = glm.array(glm.uint32, *lines),
-            frame = glm.array(glm.uint32, *frame),
-            usemtl = usemtl,
-        )
+        print("Obj file name:", os.path.split(path)[-1])
+
+    cached = load_obj_cache(path) if use_cache else None
+    if cached is not None:
+        mesh, face_cnt = cached
+        if log:
+            print("Loaded from cache")
+            print("Number of faces:", face_cnt)
+            print("Number of triangles:", len(mesh.combined[1]) // 3 if mesh.combined is not None else 0)
+        Object = GLObject(mesh=mesh)
+        try:
+            mesh.get_triangle_bvh()
+        except:
+            discard_obj(Object)
+            raise
+        return Object
+
+    report(0.05)
+    workers = workers or PARSE_WORKERS or os.cpu_count() or 1
+    data = None
+    stream_progress = lambda fraction: report(0.05 + 0.55 * fraction)
+    if workers > 1 and os.path.getsize(path) >= PARALLEL_MIN_BYTES:
+        try:
+            data = parse_obj_parallel(path, workers, on_chunk, stream_progress if on_chunk is not None else None)
+        except (ValueError, IndexError):
+            pass
+
+    elif on_chunk is not None:
+        try:
+            data = parse_obj_streaming(path, on_chunk, progress=stream_progress)
+        except (ValueError, IndexError):
+            pass
+
+    if data is None:
+        with open(path, "rb") as file:
+            obj = file.read()
+
+        try:
+            data = parse_obj(obj)
+        except (ValueError, IndexError):
+            data = parse_obj_lines(obj.decode('UTF-8'))
+
+    report(0.6)
+    loaded = []     # every material read, their textures are prefetched
+    try:
+        return import_obj_mesh(path, data, loaded, use_cache, log, report)
+    except:
+        for material in loaded:
+            cancel_material_images(material)
+        raise
+
+
+def import_obj_mesh(path, data, loaded, use_cache, log, report):
+    materials = {}
+    usemtl = []
+    dependencies = []
+
+    for kind, name, offset in data['events']:
+        if kind == 'mtllib':
+            mtpath = get_absolute_path(os.path.dirname(path), name)
+            dependencies.append(mtpath)
+            try:
+                materials = import_mtl(mtpath)
+                loaded.extend(materials.values())
+            except:
+                print('Failed to load:', mtpath)
+        else:
+            usemtl.append((offset, materials.get(name)))
+
+    if log:
+        print("Number of faces:", data['face_cnt'])
+        print("Number of triangles:", len(data['faces']) // 9)
+
+    mesh = GLMesh(
+        vertices = data['vertices'],
+        normals = data['normals'],
+        textures = data['textures'],
+        
+        faces = data['faces'] if len(data['faces']) > 0 else None,
+        lines = data['lines'] if len(data['lines']) > 0 else None,
+        frame = data['frame'] if len(data['frame']) > 0 else None,
+        usemtl = usemtl,
+        name = os.path.basename(path),
     )
 
-    
\ No newline at end of file
+    # vertex dedup is done here rather than in prepare, off the GL thread
+    report(0.7)
+    mesh.get_combined()
+
+    # content key for the mesh registry, bounds for culling and triangle BVH for picking
+    mesh.get_key()
+    mesh.get_bounds()
+    mesh.get_triangle_bvh()
+
+    report(0.9)
+    if use_cache:
+        save_obj_cache(path, mesh, data['face_cnt'], dependencies)
+
+    # materials no face uses are never prepared
+    used = {id(mtl) for _, mtl in usemtl if mtl is not None}
+    for material in loaded:
+        if id(material) not in used:
+            cancel_material_images(material)
+    loaded.clear()
+
+    return GLObject(mesh=mesh)
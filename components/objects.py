@@ -2,57 +2,71 @@ from OpenGL.GL import *
 from glfw.GLFW import *
 import glm
 import ctypes
+import hashlib
 import numpy as np
+from threading import Lock
 
 from dataclasses import dataclass
 
+from .textures import texture_manager
+from .resources import *
+from .uniforms import material_table
+from .bounds import Bounds, compute_bounds
+from .picking import TriangleBVH
+
 DRAW_MESH = 1 << 0
 DRAW_WIREFRAME = 1 << 1
 DRAW_SHADELESS = 1 << 2
 
 
 
-def prepare_vao_face(vertices, normals, textures, faces, materials):
-    if vertices is None:
-        return None
-    
-    vertex_dict = {}
-    vertices_combined = []
-    faces_combined = []
+def unique_rows(rows):
+    # unique (N, k) integer rows in order of first occurrence, and the index of every row into them
+    rows = np.asarray(rows, dtype=np.int64)
+    extents = rows.max(axis=0, initial=0) + 1 if len(rows) > 0 else np.ones(rows.shape[1], dtype=np.int64)
 
-    for i in range(0, len(faces), 3):
-        face = [faces[i], faces[i+1], faces[i+2]] #vertex, texture, normal
+    if np.prod(extents.astype(np.float64)) < 2**62:
+        # pack every row into one integer so a 1D unique can be used
+        keys = np.zeros(len(rows), dtype=np.int64)
+        for column in range(rows.shape[1]):
+            keys = keys * extents[column] + rows[:, column]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
 
-        index_hash = ','.join(list(map(str, face)))
+    # np.unique sorts; renumber by first occurrence
+    order = np.argsort(first, kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return first[order], rank[inverse.reshape(-1)]
 
-        face_index = vertex_dict.get(index_hash)
-        
-        if face_index is None:
-            vertex_dict[index_hash] = len(vertices_combined)
-            faces_combined.append(len(vertices_combined))
-
-            if textures is not None:
-                vertices_combined.append([
-                    *vertices[3*face[0] : 3*(face[0]+1)], 
-                    *textures[2*face[1] : 2*(face[1]+1)],
-                    *normals[3*face[2] : 3*(face[2]+1)],
-                ])
-            else:
-                vertices_combined.append([
-                    *vertices[3*face[0] : 3*(face[0]+1)], 
-                    0, 0,
-                    *normals[3*face[2] : 3*(face[2]+1)],
-                ])
-        else:
-            faces_combined.append(face_index)
 
-    vertices_combined = glm.array(glm.float32, *np.array(vertices_combined).flatten())
+def combine_vertices(vertices, normals, textures, faces):
+    # faces holds (vertex, texture, normal) index triples; every distinct triple becomes
+    # one interleaved vertex: position(3), uv(2), normal(3)
+    corners = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    first, faces_combined = unique_rows(corners)
+    unique_corners = corners[first]
+
+    vertices_combined = np.zeros((len(unique_corners), 8), dtype=np.float32)
+    vertices_combined[:, 0:3] = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)[unique_corners[:, 0]]
+    if textures is not None:
+        vertices_combined[:, 3:5] = np.asarray(textures, dtype=np.float32).reshape(-1, 2)[unique_corners[:, 1]]
+    if normals is not None:
+        vertices_combined[:, 5:8] = np.asarray(normals, dtype=np.float32).reshape(-1, 3)[unique_corners[:, 2]]
+
+    return vertices_combined.reshape(-1), faces_combined.astype(np.uint32)
+
+
+def prepare_vao_face(vertices_combined, faces_combined, materials, owner=None):
+    if vertices_combined is None:
+        return None
 
     # create and activate VBO (vertex buffer object)
-    VBO_vertex = glGenBuffers(1)   # create a buffer object ID and store it to VBO variable
+    VBO_vertex = gen_buffer(owner)   # create a buffer object ID and store it to VBO variable
     glBindBuffer(GL_ARRAY_BUFFER, VBO_vertex)  # activate VBO as a vertex buffer object
     # copy vertex data to VBO
-    glBufferData(GL_ARRAY_BUFFER, vertices_combined.nbytes, vertices_combined.ptr, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
+    buffer_data(GL_ARRAY_BUFFER, VBO_vertex, vertices_combined.nbytes, vertices_combined, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
 
 
     VAOs = []
@@ -63,10 +77,10 @@ def prepare_vao_face(vertices, normals, textures, faces, materials):
         if s == e:
             continue
 
-        _faces_combined = glm.array(glm.uint32, *faces_combined[s:e])
+        _faces_combined = faces_combined[s:e]
         
         # create and activate VAO (vertex array object)
-        VAO = glGenVertexArrays(1)  # create a vertex array object ID and store it to VAO variable
+        VAO = gen_vertex_array(owner)  # create a vertex array object ID and store it to VAO variable
         glBindVertexArray(VAO)      # activate VAO
 
         glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 8*glm.sizeof(glm.float32), None)
@@ -79,39 +93,42 @@ def prepare_vao_face(vertices, normals, textures, faces, materials):
         glEnableVertexAttribArray(2)
     
         # indexing
-        EBO = glGenBuffers(1)
+        EBO = gen_buffer(owner)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
-        glBufferData(GL_ELEMENT_ARRAY_BUFFER, _faces_combined.nbytes, _faces_combined.ptr, GL_STATIC_DRAW)
+        buffer_data(GL_ELEMENT_ARRAY_BUFFER, EBO, _faces_combined.nbytes, _faces_combined, GL_STATIC_DRAW)
 
         glBindVertexArray(0)
 
         VAOs.append(VAO)
-        face_lengths.append(e-s)
+        face_lengths.append(len(_faces_combined))
     
     return VAOs, face_lengths
 
 
-def prepare_vao_line(vertices, lines):
+def prepare_vao_line(vertices, lines, owner=None):
     if vertices is None:
         return None
 
+    vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+    lines = np.ascontiguousarray(lines, dtype=np.uint32)
+
     # create and activate VAO (vertex array object)
-    VAO = glGenVertexArrays(1)  # create a vertex array object ID and store it to VAO variable
+    VAO = gen_vertex_array(owner)  # create a vertex array object ID and store it to VAO variable
     glBindVertexArray(VAO)      # activate VAO
 
     # create and activate VBO (vertex buffer object)
-    VBO_vertex = glGenBuffers(1)   # create a buffer object ID and store it to VBO variable
+    VBO_vertex = gen_buffer(owner)   # create a buffer object ID and store it to VBO variable
     glBindBuffer(GL_ARRAY_BUFFER, VBO_vertex)  # activate VBO as a vertex buffer object
     # copy vertex data to VBO
-    glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices.ptr, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
+    buffer_data(GL_ARRAY_BUFFER, VBO_vertex, vertices.nbytes, vertices, GL_STATIC_DRAW) # allocate GPU memory for and copy vertex data to the currently bound vertex buffer
     
     glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 3*glm.sizeof(glm.float32), None)
     glEnableVertexAttribArray(0)
 
     # indexing
-    EBO = glGenBuffers(1)
+    EBO = gen_buffer(owner)
     glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, EBO)
-    glBufferData(GL_ELEMENT_ARRAY_BUFFER, lines.nbytes, lines.ptr, GL_STATIC_DRAW)
+    buffer_data(GL_ELEMENT_ARRAY_BUFFER, EBO, lines.nbytes, lines, GL_STATIC_DRAW)
 
     glBindVertexArray(0)
     
@@ -127,35 +144,58 @@ class GLMaterial:
     shininess: float = 16.0
     disffuse_map: int = None
     normal_map: int = None
+    diffuse_map_path: str = None
+    normal_map_path: str = None
+    block_index: int = None     # slot in material_table
+
+    def prepare(self):
+        # textures are shared between materials through texture_manager
+        if self.diffuse_map_path is not None and self.disffuse_map is None:
+            self.disffuse_map = texture_manager.acquire(self.diffuse_map_path)
+
+        if self.normal_map_path is not None and self.normal_map is None:
+            self.normal_map = texture_manager.acquire(self.normal_map_path)
+
+        if self.block_index is None:
+            self.block_index = material_table.add(self.ambient, self.diffuse, self.specular, self.shininess,
+                                                  self.disffuse_map is not None, self.normal_map is not None)
+
+    def release(self):
+        if self.disffuse_map is not None:
+            texture_manager.release(self.diffuse_map_path)
+            self.disffuse_map = None
+
+        if self.normal_map is not None:
+            texture_manager.release(self.normal_map_path)
+            self.normal_map = None
+
+        if self.block_index is not None:
+            material_table.remove(self.block_index)
+            self.block_index = None
+
+    def apply(self):
+        if self.block_index is None:
+            self.prepare()
+        material_table.bind(self.block_index)
 
-    def apply(self, uniform_locs, ignore_light):
         if self.disffuse_map is not None:
             glActiveTexture(GL_TEXTURE0)
-            glUniform1i(uniform_locs['useDiffuseMap'], 1)
             glBindTexture(GL_TEXTURE_2D, self.disffuse_map)
-        else:
-            glUniform1i(uniform_locs['useDiffuseMap'], 0)
 
         if self.normal_map is not None:
             glActiveTexture(GL_TEXTURE1)
-            glUniform1i(uniform_locs['useNormalMap'], 1)
             glBindTexture(GL_TEXTURE_2D, self.normal_map)
-        else:
-            glUniform1i(uniform_locs['useNormalMap'], 0)
 
-        if ignore_light:
-            return
 
-        glUniform3f(uniform_locs['Ka'], *self.ambient)
-        glUniform3f(uniform_locs['Kd'], *self.diffuse)
-        glUniform3f(uniform_locs['Ks'], *self.specular)
-        glUniform1f(uniform_locs['Ns'], self.shininess)
+# used for faces without a material, and for lines
+default_material = GLMaterial(name='default')
 
 
 
 
 class GLMesh:
-    def __init__(self, vertices=None, normals=None, textures=None, faces=None, lines=None, frame=None, usemtl=[]):
+    def __init__(self, vertices=None, normals=None, textures=None, faces=None, lines=None, frame=None, usemtl=[], combined=None, name=''):
+        self.name = name
         self.vertices = vertices
         self.normals = normals
         self.textures = textures
@@ -163,9 +203,14 @@ class GLMesh:
         self.faces = faces
         self.lines = lines
         self.frame = frame
+        self.usemtl = usemtl
+
+        # (interleaved vertices, indices) of the faces, see combine_vertices
+        self.combined = combined
 
         self.materials = None
-        if faces is not None:
+        if faces is not None or combined is not None:
+            corner_cnt = len(faces) // 3 if faces is not None else len(combined[1])
             materials = [[None, [0, -1]]]
             for mtl in usemtl:
                 if materials[-1][1][0] == mtl[0]:
@@ -173,23 +218,242 @@ class GLMesh:
                 else:
                     materials[-1][1][1] = mtl[0]
                 materials.append([mtl[1], [mtl[0], -1]])
-            materials[-1][1][1] = len(faces)
+            materials[-1][1][1] = corner_cnt
             self.materials = materials
 
         self.vao_faces_list = None
         self.face_lengths = None
         self.vao_lines = None
         self.vao_frame = None
+
+        # non-indexed triangles drawn after the faces, see GLStreamingMesh
+        self.vao_stream = None
+        self.stream_count = 0
+
+        # local Bounds of the drawn geometry, see get_bounds
+        self.bounds = None
+
+        # TriangleBVH of the faces for picking, see get_triangle_bvh
+        self.triangle_bvh = None
+
+        # GPU geometry, shared through mesh_registry with every mesh of identical content
+        self.shared = True
+        self.key = None
+        self.entry = None
                 
-    def prepare(self):
-        if self.faces is not None:      
-            self.vao_faces_list, self.face_lengths = prepare_vao_face(self.vertices, self.normals, self.textures, self.faces, self.materials)
+    def get_combined(self):
+        if self.combined is None and self.faces is not None:
+            self.combined = combine_vertices(self.vertices, self.normals, self.textures, self.faces)
+        return self.combined
+
+    def get_bounds(self):
+        # computed once, normally at load time off the GL thread
+        if self.bounds is None:
+            positions = []
+            if self.materials is not None:
+                positions.append(self.get_combined()[0].reshape(-1, 8)[:, :3])
+            vertices = np.asarray(self.vertices, dtype=np.float32).reshape(-1, 3) if self.vertices is not None else None
+            for indices in (self.lines, self.frame):
+                if indices is not None:
+                    positions.append(vertices[np.asarray(indices, dtype=np.int64)])
+            if len(positions) > 0:
+                self.bounds = compute_bounds(np.concatenate(positions))
+        return self.bounds
+
+    def get_triangle_bvh(self):
+        # built once, normally at load time off the GL thread; shared with meshes of identical content
+        if self.triangle_bvh is None and self.materials is not None:
+            if self.entry is not None and self.entry.triangle_bvh is not None:
+                self.triangle_bvh = self.entry.triangle_bvh
+            else:
+                vertices_combined, faces_combined = self.get_combined()
+                self.triangle_bvh = TriangleBVH(vertices_combined.reshape(-1, 8)[:, :3], faces_combined)
+        return self.triangle_bvh
+
+    def get_key(self):
+        # hash of everything uploaded in prepare; can be computed ahead of time off the GL thread
+        if self.key is None:
+            sha1 = hashlib.sha1()
+            def update(tag, array, dtype):
+                # in the dtype it is uploaded as
+                if array is None:
+                    return
+                array = np.ascontiguousarray(array, dtype=dtype)
+                sha1.update(f'{tag}:{array.dtype.str}:{array.shape};'.encode())
+                sha1.update(array.data)
+
+            if self.materials is not None:
+                vertices_combined, faces_combined = self.get_combined()
+                update('interleaved', vertices_combined, np.float32)
+                update('indices', faces_combined, np.uint32)
+                update('ranges', [r for _, r in self.materials], np.int64)
+            if self.lines is not None or self.frame is not None:
+                update('vertices', self.vertices, np.float32)
+            update('lines', self.lines, np.uint32)
+            update('frame', self.frame, np.uint32)
+            self.key = sha1.hexdigest()
+        return self.key
+
+    def upload(self, owner):
+        # GL buffers of this mesh, owned by its registry entry
+        vao_faces_list, face_lengths, vao_lines, vao_frame = None, None, None, None
+        if self.materials is not None:
+            vao_faces_list, face_lengths = prepare_vao_face(*self.get_combined(), self.materials, owner)
         
         if self.lines is not None:
-            self.vao_lines = prepare_vao_line(self.vertices, self.lines)
+            vao_lines = prepare_vao_line(self.vertices, self.lines, owner)
 
         if self.frame is not None:
-            self.vao_frame = prepare_vao_line(self.vertices, self.frame)
+            vao_frame = prepare_vao_line(self.vertices, self.frame, owner)
+
+        return vao_faces_list, face_lengths, vao_lines, vao_frame
+
+    def prepare(self):
+        if self.materials is not None:
+            for mtl, _ in self.materials:
+                if mtl is not None:
+                    mtl.prepare()
+
+        if self.entry is None:
+            self.entry = mesh_registry.acquire(self)
+            if self.entry.triangle_bvh is None:
+                self.entry.triangle_bvh = self.triangle_bvh
+            elif self.triangle_bvh is not None:
+                self.triangle_bvh = self.entry.triangle_bvh
+        self.vao_faces_list, self.face_lengths, self.vao_lines, self.vao_frame = self.entry.buffers
+
+    def release(self):
+        # GL thread: the mesh can be prepared again afterwards
+        if self.materials is not None:
+            for mtl, _ in self.materials:
+                if mtl is not None:
+                    mtl.release()
+        if self.entry is not None:
+            mesh_registry.release(self.entry)
+            self.entry = None
+        gpu_resources.release(self)
+
+        self.vao_faces_list = None
+        self.face_lengths = None
+        self.vao_lines = None
+        self.vao_frame = None
+
+
+class MeshEntry:
+    def __init__(self, key, name):
+        self.key = key
+        self.mesh_name = name
+        self.buffers = None     # (vao_faces_list, face_lengths, vao_lines, vao_frame)
+        self.triangle_bvh = None
+        self.refcount = 0
+
+    @property
+    def name(self):
+        # shown in the GPU resource report
+        return self.mesh_name if self.refcount <= 1 else f'{self.mesh_name} (x{self.refcount})'
+
+
+class MeshRegistry:
+    # Meshes with identical geometry share one set of GL buffers and VAOs, deleted
+    # when the last mesh using them is released. Materials stay per mesh.
+    def __init__(self):
+        self.entries = {}
+        self.lock = Lock()
+
+    def acquire(self, mesh):
+        # GL thread
+        key = mesh.get_key() if mesh.shared else None
+        with self.lock:
+            entry = self.entries.get(key) if key is not None else None
+            if entry is None:
+                entry = MeshEntry(key, mesh.name or type(mesh).__name__)
+                entry.buffers = mesh.upload(entry)
+                if key is not None:
+                    self.entries[key] = entry
+            entry.refcount += 1
+        return entry
+
+    def release(self, entry):
+        with self.lock:
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            if self.entries.get(entry.key) is entry:
+                del self.entries[entry.key]
+        gpu_resources.release(entry)
+
+    def get_stats(self):
+        with self.lock:
+            entries = list(self.entries.values())
+        return {
+            'meshes': len(entries),
+            'references': sum(entry.refcount for entry in entries),
+        }
+
+
+mesh_registry = MeshRegistry()
+
+
+class GLStreamingMesh(GLMesh):
+    # Non-indexed triangles appended while a file is still being parsed; the buffer
+    # grows on the GPU, copying what was uploaded so far into a larger one
+    def __init__(self, capacity=1 << 16, name=''):
+        super().__init__(name=name)
+        self.vbo_stream = None
+        self.stream_capacity = capacity     # in vertices
+
+    def prepare(self):
+        self.vao_stream = gen_vertex_array(self)
+        self.reserve(self.stream_capacity)
+
+    def reserve(self, capacity):
+        stride = 8*glm.sizeof(glm.float32)
+        VBO = gen_buffer(self)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, VBO)
+        buffer_data(GL_COPY_WRITE_BUFFER, VBO, capacity*stride, None, GL_DYNAMIC_DRAW)
+
+        if self.vbo_stream is not None:
+            if self.stream_count > 0:
+                glBindBuffer(GL_COPY_READ_BUFFER, self.vbo_stream)
+                glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, self.stream_count*stride)
+            gpu_resources.delete(RESOURCE_BUFFER, [self.vbo_stream])
+
+        self.vbo_stream = VBO
+        self.stream_capacity = capacity
+
+        glBindVertexArray(self.vao_stream)
+        glBindBuffer(GL_ARRAY_BUFFER, VBO)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, stride, None)
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3*glm.sizeof(glm.float32)))
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(5*glm.sizeof(glm.float32)))
+        glEnableVertexAttribArray(2)
+        glBindVertexArray(0)
+
+    def append(self, data):
+        # data: (N, 8) interleaved position, uv, normal
+        data = np.ascontiguousarray(data, dtype=np.float32).reshape(-1, 8)
+        if len(data) == 0 or self.vao_stream is None:
+            # nothing to add, or already released
+            return
+        if self.stream_count + len(data) > self.stream_capacity:
+            self.reserve(max(2*self.stream_capacity, self.stream_count + len(data)))
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo_stream)
+        glBufferSubData(GL_ARRAY_BUFFER, self.stream_count*data.itemsize*8, data.nbytes, data)
+        self.stream_count += len(data)
+
+        bounds = compute_bounds(data[:, :3])
+        if self.bounds is not None:
+            bounds = Bounds(np.minimum(self.bounds.lo, bounds.lo), np.maximum(self.bounds.hi, bounds.hi))
+        self.bounds = bounds
+
+    def release(self):
+        super().release()
+        self.vao_stream = None
+        self.vbo_stream = None
+        self.stream_count = 0
 
 
 class GLObject:
@@ -206,16 +470,44 @@ class GLObject:
 
         self.mesh = mesh
 
+        # world Bounds of the mesh, and the (mesh bounds, model matrix) they were computed for
+        self.world_bounds = None
+        self.world_bounds_key = None
+        self.scene = None       # SceneBVH notified when the world bounds change
+
 
     def update_tree_global_transform(self):
         if self.parent is not None:
             self.global_transform = self.parent.global_transform * self.link_transform * self.joint_transform
         else:
             self.global_transform = self.link_transform * self.joint_transform
+        self.update_world_bounds()
 
         for child in self.children:
             child.update_tree_global_transform()
 
+    def update_world_bounds(self):
+        bounds = self.mesh.get_bounds() if self.mesh is not None else None
+        if bounds is None:
+            if self.world_bounds is not None and self.scene is not None:
+                self.scene.mark_dirty(self)
+            self.world_bounds = None
+            return
+
+        M = self.get_global_transform() * self.get_shape_transform()
+        key = (bounds, M)
+        if self.world_bounds_key is not None and self.world_bounds_key[0] is bounds and self.world_bounds_key[1] == M:
+            return
+        self.world_bounds = bounds.transformed(np.array(M, dtype=np.float32))
+        self.world_bounds_key = key
+        if self.scene is not None:
+            self.scene.mark_dirty(self)
+
+    def get_world_bounds(self):
+        # shape transforms are also edited directly, so check the cached bounds are current
+        self.update_world_bounds()
+        return self.world_bounds
+
     def get_global_transform(self):
         return self.global_transform
     def get_shape_transform(self):
@@ -229,6 +521,7 @@ class GLObject:
             self.joint_transform = joint_transform
         if link_transform is not None:
             self.link_transform = link_transform
+        self.update_world_bounds()
     
     def set_parent(self, parent):
         if self.parent is not None:
@@ -242,45 +535,54 @@ class GLObject:
         if self.mesh is not None:
             self.mesh.prepare()
 
+    def release(self):
+        # GL thread: frees the meshes of the whole subtree
+        if self.mesh is not None:
+            self.mesh.release()
+        for child in self.children:
+            child.release()
+
     def Draw(self, VP, uniform_locs, ignore_light, mode, color=(1, 1, 1)):
         if self.mesh is None:
             return
         mesh = self.get_mesh()
 
+        # VP comes from the Frame uniform block
         M = self.get_global_transform() * self.get_shape_transform()
-        MVP = VP * M
 
-        glUniformMatrix4fv(uniform_locs['MVP'], 1, GL_FALSE, glm.value_ptr(MVP))
-        glUniformMatrix4fv(uniform_locs['M'], 1, GL_FALSE, glm.value_ptr(M))
-        glUniform3f(uniform_locs['mesh_color'], *color)
-        glUniform3f(uniform_locs['Ka'], 1, 1, 1)
-        glUniform3f(uniform_locs['Kd'], 1, 1, 1)
+        draw_mesh(mesh, glm.value_ptr(M), uniform_locs, ignore_light, mode, color)
 
-        if mesh.vao_faces_list is not None and mode & DRAW_MESH:
-            glUniform1i(uniform_locs['ignore_light'], ignore_light)
 
-            for i in range(len(mesh.vao_faces_list)):
-                vao_faces = mesh.vao_faces_list[i]
-                face_length = mesh.face_lengths[i]
-                glBindVertexArray(vao_faces)
+def draw_mesh(mesh, M, uniform_locs, ignore_light, mode, color=(1, 1, 1)):
+    glUniformMatrix4fv(uniform_locs['M'], 1, GL_FALSE, M)
+    glUniform3f(uniform_locs['mesh_color'], *color)
 
-                mtl = mesh.materials[i][0]
-                if mtl is not None:
-                    mtl.apply(uniform_locs, ignore_light)
-                else:
-                    GLMaterial().apply(uniform_locs, ignore_light)
-            
-                glDrawElements(GL_TRIANGLES, face_length, GL_UNSIGNED_INT, None)
+    if mesh.vao_faces_list is not None and mode & DRAW_MESH:
+        glUniform1i(uniform_locs['ignore_light'], ignore_light)
 
-        if mesh.vao_lines is not None and mode & DRAW_MESH:
-            glBindVertexArray(mesh.vao_lines)
-            glDrawElements(GL_LINES, len(mesh.lines), GL_UNSIGNED_INT, None)
-
-        glUniform1i(uniform_locs['ignore_light'], 1)
-        glUniform1i(uniform_locs['useDiffuseMap'], 0)
-        glUniform1i(uniform_locs['useNormalMap'], 0)
+        for i in range(len(mesh.vao_faces_list)):
+            vao_faces = mesh.vao_faces_list[i]
+            face_length = mesh.face_lengths[i]
+            glBindVertexArray(vao_faces)
 
-        if mesh.vao_frame is not None and mode & DRAW_WIREFRAME:
-            glBindVertexArray(mesh.vao_frame)
-            glDrawElements(GL_LINES, len(mesh.frame), GL_UNSIGNED_INT, None)
+            mtl = mesh.materials[i][0]
+            (mtl if mtl is not None else default_material).apply()
         
+            glDrawElements(GL_TRIANGLES, face_length, GL_UNSIGNED_INT, None)
+
+    if mesh.stream_count > 0 and mode & DRAW_MESH:
+        glUniform1i(uniform_locs['ignore_light'], ignore_light)
+        default_material.apply()
+        glBindVertexArray(mesh.vao_stream)
+        glDrawArrays(GL_TRIANGLES, 0, mesh.stream_count)
+
+    if mesh.vao_lines is not None and mode & DRAW_MESH:
+        default_material.apply()
+        glBindVertexArray(mesh.vao_lines)
+        glDrawElements(GL_LINES, len(mesh.lines), GL_UNSIGNED_INT, None)
+
+    if mesh.vao_frame is not None and mode & DRAW_WIREFRAME:
+        glUniform1i(uniform_locs['ignore_light'], 1)
+        default_material.apply()
+        glBindVertexArray(mesh.vao_frame)
+        glDrawElements(GL_LINES, len(mesh.frame), GL_UNSIGNED_INT, None)
@@ -0,0 +1,230 @@
+import numpy as np
+
+from .scene_bvh import concat_ranges
+
+# Ray picking of mesh triangles and bones.
+# Every mesh gets a triangle BVH built once from its deduplicated vertex/index buffers:
+# triangles are sorted along a Morton curve and cut into leaves of LEAF_SIZE, and the
+# tree above the leaves is a complete tree of BRANCH children per node stored level by
+# level, so it is built and traversed with a handful of numpy calls per level.
+LEAF_SIZE = 8
+BRANCH = 8
+MORTON_BITS = 10    # per axis
+
+
+def spread_bits(x):
+    # insert two zero bits between the low 10 bits of x
+    x = x.astype(np.uint64) & 0x3ff
+    x = (x | (x << 16)) & 0x30000ff
+    x = (x | (x << 8)) & 0x300f00f
+    x = (x | (x << 4)) & 0x30c30c3
+    x = (x | (x << 2)) & 0x9249249
+    return x
+
+
+def morton_codes(points, lo, hi):
+    scale = (1 << MORTON_BITS) - 1
+    cells = ((points - lo) / np.maximum(hi - lo, 1e-12) * scale).astype(np.int64).clip(0, scale)
+    return spread_bits(cells[:, 0]) << 2 | spread_bits(cells[:, 1]) << 1 | spread_bits(cells[:, 2])
+
+
+def slab_test(lo, hi, origin, inverse):
+    # entry and exit distances of the ray through (N, 3) boxes
+    with np.errstate(invalid='ignore'):
+        t0, t1 = (lo - origin) * inverse, (hi - origin) * inverse
+    near = np.nan_to_num(np.minimum(t0, t1), nan=-np.inf).max(axis=1)
+    far = np.nan_to_num(np.maximum(t0, t1), nan=np.inf).min(axis=1)
+    return np.maximum(near, 0), far
+
+
+def intersect_triangles(origin, direction, v0, v1, v2, eps=1e-9):
+    # Moller-Trumbore for (N, 3) triangle corners -> (N,) t, inf where missed
+    e1, e2 = v1 - v0, v2 - v0
+    p = np.cross(direction, e2)
+    det = (e1 * p).sum(axis=1)
+    valid = np.abs(det) > eps
+    inverse_det = np.where(valid, 1 / np.where(valid, det, 1), 0)
+
+    s = origin - v0
+    u = (s * p).sum(axis=1) * inverse_det
+    q = np.cross(s, e1)
+    v = (q * direction).sum(axis=1) * inverse_det
+    t = (e2 * q).sum(axis=1) * inverse_det
+
+    hit = valid & (u >= 0) & (v >= 0) & (u + v <= 1) & (t >= 0)
+    return np.where(hit, t, np.inf)
+
+
+class TriangleBVH:
+    def __init__(self, positions, indices, leaf_size=None, branch=None):
+        self.leaf_size = leaf_size or LEAF_SIZE
+        self.branch = branch or BRANCH
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32).reshape(-1, 3)
+        self.triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+
+        if len(self.triangles) == 0:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.depth = 0
+            self.levels = [np.full((1, 2, 3), np.nan, dtype=np.float32)]
+            return
+
+        corners = self.positions[self.triangles]
+        lo, hi = corners.min(axis=1), corners.max(axis=1)
+        codes = morton_codes((lo + hi) / 2, lo.min(axis=0), hi.max(axis=0))
+        self.order = np.argsort(codes, kind='stable')
+        lo, hi = lo[self.order], hi[self.order]
+
+        count = len(self.order)
+        leaf_count = (count + self.leaf_size - 1) // self.leaf_size
+        self.depth = 0
+        while self.branch**self.depth < leaf_count:
+            self.depth += 1
+
+        # leaves past leaf_count are empty: NaN boxes fail every slab test and
+        # are skipped by fmin/fmax when the boxes above them are computed
+        leaves = np.full((self.branch**self.depth, 2, 3), np.nan, dtype=np.float32)
+        starts = np.arange(0, count, self.leaf_size)
+        leaves[:leaf_count, 0] = np.minimum.reduceat(lo, starts)
+        leaves[:leaf_count, 1] = np.maximum.reduceat(hi, starts)
+
+        # levels[d] holds the (branch**d, 2, 3) lo/hi boxes of depth d; the children of
+        # node i are branch*i .. branch*i + branch-1
+        self.levels = [leaves]
+        for _ in range(self.depth):
+            children = self.levels[0].reshape(-1, self.branch, 2, 3)
+            self.levels.insert(0, np.stack([np.fmin.reduce(children[:, :, 0], axis=1), np.fmax.reduce(children[:, :, 1], axis=1)], axis=1))
+
+    def intersect(self, origin, direction, max_t=np.inf):
+        # nearest hit -> (t, triangle index) or None
+        if len(self.order) == 0:
+            return None
+        origin = np.asarray(origin, dtype=np.float32)
+        direction = np.asarray(direction, dtype=np.float32)
+        # no infinities, so a slab test never computes 0*inf
+        inverse = 1 / np.where(np.abs(direction) < 1e-30, np.copysign(1e-30, direction), direction)
+
+        nodes = np.zeros(1, dtype=np.int64)
+        children = np.arange(self.branch)
+        for d in range(self.depth + 1):
+            t = (self.levels[d][nodes] - origin) * inverse
+            near = np.maximum(np.minimum(t[:, 0], t[:, 1]).max(axis=1), 0)
+            far = np.maximum(t[:, 0], t[:, 1]).min(axis=1)
+            nodes = nodes[(near <= far) & (near <= max_t)]
+            if len(nodes) == 0:
+                return None
+            if d < self.depth:
+                nodes = (nodes[:, None] * self.branch + children).reshape(-1)
+
+        starts = nodes * self.leaf_size
+        candidates = self.order[concat_ranges(starts, np.minimum(starts + self.leaf_size, len(self.order)))]
+
+        corners = self.positions[self.triangles[candidates]]
+        t = intersect_triangles(origin, direction, corners[:, 0], corners[:, 1], corners[:, 2])
+        best = int(np.argmin(t))
+        if not t[best] <= max_t:
+            return None
+        return float(t[best]), int(candidates[best])
+
+
+def intersect_capsules(origin, direction, a, b, radius):
+    # (N,) distance along the ray to each capsule a-b of the given radius, inf where missed
+    v = b - a
+    w = origin - a
+    vv = (v * v).sum(axis=1)
+    dv = v @ direction
+    dd = direction @ direction
+    dw = w @ direction
+    vw = (v * w).sum(axis=1)
+
+    # closest points of the ray line and the segment
+    denominator = dd * vv - dv * dv
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(denominator > 1e-12, (dd * vw - dv * dw) / denominator, 0).clip(0, 1)
+        t = np.maximum((s * dv - dw) / dd, 0)
+        s = np.where(vv > 1e-12, ((origin + t[:, None] * direction - a) * v).sum(axis=1) / vv, 0).clip(0, 1)
+
+    closest = a + s[:, None] * v
+    to_axis = origin + t[:, None] * direction - closest
+    distance2 = (to_axis * to_axis).sum(axis=1)
+    hit = distance2 <= radius * radius
+
+    # back off from the closest approach to where the ray enters the radius
+    entry = t - np.sqrt(np.maximum(radius * radius - distance2, 0) / dd)
+    return np.where(hit, np.maximum(entry, 0), np.inf)
+
+
+class PickResult:
+    def __init__(self, t, point, object=None, triangle=None, animation=None, joint=None):
+        self.t = t
+        self.point = point
+        self.object = object        # picked GLObject, with the triangle index into its mesh
+        self.triangle = triangle
+        self.animation = animation  # or picked bone: GLAnimation and joint index
+        self.joint = joint
+
+
+def sort_by_entry(origin, direction, objects):
+    # [(t entering the world bounds, object)] nearest first, as SceneBVH.query_ray without the tree
+    objects = [object for object in objects if object.get_world_bounds() is not None]
+    if len(objects) == 0:
+        return []
+    lo = np.array([object.world_bounds.lo for object in objects])
+    hi = np.array([object.world_bounds.hi for object in objects])
+    with np.errstate(divide='ignore'):
+        near, far = slab_test(lo, hi, np.asarray(origin, dtype=np.float32), 1 / np.asarray(direction, dtype=np.float32))
+    return [(float(near[i]), objects[i]) for i in np.argsort(near, kind='stable') if near[i] <= far[i]]
+
+
+def pick_objects(origin, direction, candidates, max_t=np.inf):
+    # candidates: [(t entering the world bounds, GLObject)], nearest first
+    best = None
+    for near, object in candidates:
+        if near > max_t:
+            break
+        mesh = object.get_mesh()
+        bvh = mesh.get_triangle_bvh() if mesh is not None else None
+        if bvh is None:
+            continue
+
+        # the ray in mesh space keeps its parametrization
+        M = np.array(object.get_global_transform() * object.get_shape_transform(), dtype=np.float64)
+        inverse = np.linalg.inv(M)
+        local_origin = inverse[:3, :3] @ origin + inverse[:3, 3]
+        local_direction = inverse[:3, :3] @ direction
+
+        hit = bvh.intersect(local_origin, local_direction, max_t)
+        if hit is not None:
+            max_t = hit[0]
+            best = PickResult(hit[0], origin + hit[0] * direction, object=object, triangle=hit[1])
+    return best
+
+
+def pick_bones(origin, direction, animations, max_t=np.inf):
+    best = None
+    for animation in animations:
+        joints, models = animation.get_bone_models()
+        if len(models) == 0:
+            continue
+
+        # bones are unit boxes along y scaled to the bone, see SkeletonMesh
+        a = models[:, :3, 3]
+        b = a + models[:, :3, 1]
+        radius = 0.5 * np.maximum(np.linalg.norm(models[:, :3, 0], axis=1), np.linalg.norm(models[:, :3, 2], axis=1))
+
+        t = intersect_capsules(origin, direction, a, b, radius)
+        i = int(np.argmin(t))
+        if t[i] < max_t:
+            max_t = t[i]
+            best = PickResult(float(t[i]), origin + t[i] * direction, animation=animation, joint=int(joints[i]))
+    return best
+
+
+def pick(origin, direction, candidates=(), animations=()):
+    # nearest of the picked triangle and bone, or None
+    origin = np.asarray(origin, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    direction = direction / np.linalg.norm(direction)
+
+    best = pick_objects(origin, direction, candidates)
+    bone = pick_bones(origin, direction, animations, best.t if best is not None else np.inf)
+    return bone if bone is not None else best
@@ -0,0 +1,62 @@
+import time
+
+
+class PlaybackClock:
+    # Maps wall-clock time to a frame index and an interpolation factor.
+    # Frames are skipped when rendering falls behind, so playback keeps pace.
+    def __init__(self, framerate, frames, speed=1.0, fixed_step=None, timer=time.perf_counter):
+        self.framerate = framerate      # seconds per frame (BVH "Frame Time")
+        self.frames = frames
+        self.speed = speed
+        self.fixed_step = fixed_step    # seconds per tick for deterministic (offline) playback
+        self.timer = timer
+
+        self.paused = True
+        self.position = 0.0             # in frames, fractional part is the interpolation factor
+        self.last_time = None
+
+    def tick(self):
+        if self.paused:
+            self.last_time = None
+            return
+
+        if self.fixed_step is not None:
+            dt = self.fixed_step
+        else:
+            now = self.timer()
+            dt = 0.0 if self.last_time is None else now - self.last_time
+            self.last_time = now
+
+        self.position = (self.position + dt * self.speed / self.framerate) % self.frames
+
+    def frame(self):
+        # tolerate rounding from accumulated steps landing just short of a frame
+        return int(self.position + 1e-6) % self.frames
+
+    def factor(self):
+        return max(0.0, self.position - int(self.position + 1e-6))
+
+    def play(self):
+        self.paused = False
+        self.last_time = None
+
+    def pause(self):
+        self.paused = True
+        self.last_time = None
+
+    def toggle(self):
+        if self.paused:
+            self.play()
+        else:
+            self.pause()
+
+    def seek(self, frame):
+        self.position = float(frame % self.frames)
+        self.last_time = None
+
+    def step(self, count=1):
+        self.pause()
+        self.seek(self.frame() + count)
+
+    def set_speed(self, speed):
+        self.speed = speed
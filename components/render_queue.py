@@ -0,0 +1,120 @@
+from .objects import *
+
+# Draws of a frame are collected first, sorted by textures, material and VAO, then
+# submitted in one pass that only issues the state changes the previous draw did
+# not already make. There is a single shader program, so it is not part of the key.
+STATE_KINDS = ('vao', 'material', 'diffuse_map', 'normal_map', 'transform', 'color', 'ignore_light')
+
+
+class DrawItem:
+    __slots__ = ('vao', 'primitive', 'count', 'indexed', 'material', 'transform', 'color', 'ignore_light', 'key')
+
+    def __init__(self, vao, primitive, count, indexed, material, transform, color, ignore_light):
+        self.vao = vao
+        self.primitive = primitive
+        self.count = count
+        self.indexed = indexed
+        self.material = material
+        self.transform = transform
+        self.color = color
+        self.ignore_light = ignore_light
+        self.key = (
+            material.disffuse_map or 0,
+            material.normal_map or 0,
+            material.block_index,
+            vao,
+            id(transform),
+        )
+
+
+class RenderQueue:
+    def __init__(self):
+        self.items = []
+        self.stats = {'draws': 0, 'state_changes': 0, 'saved': 0}
+
+    def clear(self):
+        self.items = []
+
+    def add(self, vao, primitive, count, material, transform, color, ignore_light, indexed=True):
+        if material.block_index is None:
+            material.prepare()
+        self.items.append(DrawItem(vao, primitive, count, indexed, material, transform, tuple(color), bool(ignore_light)))
+
+    def add_object(self, object, ignore_light, mode, color=(1, 1, 1), frustum=None):
+        # same draws as draw_mesh, queued; objects outside the frustum are skipped
+        mesh = object.get_mesh()
+        if mesh is None:
+            return
+        if frustum is not None and not frustum.contains(object.get_world_bounds()):
+            return
+        M = object.get_global_transform() * object.get_shape_transform()
+
+        if mesh.vao_faces_list is not None and mode & DRAW_MESH:
+            for i in range(len(mesh.vao_faces_list)):
+                mtl = mesh.materials[i][0]
+                self.add(mesh.vao_faces_list[i], GL_TRIANGLES, mesh.face_lengths[i],
+                         mtl if mtl is not None else default_material, M, color, ignore_light)
+
+        if mesh.stream_count > 0 and mode & DRAW_MESH:
+            self.add(mesh.vao_stream, GL_TRIANGLES, mesh.stream_count, default_material, M, color, ignore_light, indexed=False)
+
+        if mesh.vao_lines is not None and mode & DRAW_MESH:
+            self.add(mesh.vao_lines, GL_LINES, len(mesh.lines), default_material, M, color, ignore_light)
+
+        if mesh.vao_frame is not None and mode & DRAW_WIREFRAME:
+            self.add(mesh.vao_frame, GL_LINES, len(mesh.frame), default_material, M, color, True)
+
+    def flush(self, uniform_locs):
+        items = sorted(self.items, key=lambda item: item.key)
+        current = dict.fromkeys(STATE_KINDS)
+        changes = 0
+
+        for item in items:
+            material = item.material
+            state = {
+                'vao': item.vao,
+                'material': material.block_index,
+                'diffuse_map': material.disffuse_map,
+                'normal_map': material.normal_map,
+                'transform': id(item.transform),
+                'color': item.color,
+                'ignore_light': item.ignore_light,
+            }
+
+            for kind in STATE_KINDS:
+                value = state[kind]
+                if current[kind] == value:
+                    continue
+                # textures of materials without maps are left bound, the block disables them
+                if value is None and kind in ('diffuse_map', 'normal_map'):
+                    continue
+                current[kind] = value
+                changes += 1
+
+                if kind == 'vao':
+                    glBindVertexArray(value)
+                elif kind == 'material':
+                    material_table.bind(value)
+                elif kind == 'diffuse_map':
+                    glActiveTexture(GL_TEXTURE0)
+                    glBindTexture(GL_TEXTURE_2D, value)
+                elif kind == 'normal_map':
+                    glActiveTexture(GL_TEXTURE1)
+                    glBindTexture(GL_TEXTURE_2D, value)
+                elif kind == 'transform':
+                    glUniformMatrix4fv(uniform_locs['M'], 1, GL_FALSE, glm.value_ptr(item.transform))
+                elif kind == 'color':
+                    glUniform3f(uniform_locs['mesh_color'], *value)
+                elif kind == 'ignore_light':
+                    glUniform1i(uniform_locs['ignore_light'], value)
+
+            if item.indexed:
+                glDrawElements(item.primitive, item.count, GL_UNSIGNED_INT, None)
+            else:
+                glDrawArrays(item.primitive, 0, item.count)
+
+        # unsorted, every draw would set each state it uses
+        naive = sum(5 + (item.material.disffuse_map is not None) + (item.material.normal_map is not None) for item in items)
+        self.stats = {'draws': len(items), 'state_changes': changes, 'saved': naive - changes}
+        self.items = []
+        return self.stats
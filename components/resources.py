@@ -0,0 +1,134 @@
+from threading import Lock
+
+from OpenGL.GL import *
+
+# Every GL object the renderer creates is registered here together with its owner, the
+# python object responsible for deleting it (a mesh, the texture manager, or a plain
+# name for long-lived objects such as the framebuffer). Owners free all of their objects
+# at once with release(owner); whatever is still registered is live GPU memory.
+RESOURCE_BUFFER = 'buffers'
+RESOURCE_VERTEX_ARRAY = 'vertex_arrays'
+RESOURCE_TEXTURE = 'textures'
+RESOURCE_FRAMEBUFFER = 'framebuffers'
+RESOURCE_RENDERBUFFER = 'renderbuffers'
+
+RESOURCE_KINDS = (RESOURCE_BUFFER, RESOURCE_VERTEX_ARRAY, RESOURCE_TEXTURE, RESOURCE_FRAMEBUFFER, RESOURCE_RENDERBUFFER)
+
+
+def delete_objects(kind, ids):
+    if kind == RESOURCE_BUFFER:
+        glDeleteBuffers(len(ids), ids)
+    elif kind == RESOURCE_VERTEX_ARRAY:
+        glDeleteVertexArrays(len(ids), ids)
+    elif kind == RESOURCE_TEXTURE:
+        glDeleteTextures(ids)
+    elif kind == RESOURCE_FRAMEBUFFER:
+        glDeleteFramebuffers(len(ids), ids)
+    elif kind == RESOURCE_RENDERBUFFER:
+        glDeleteRenderbuffers(len(ids), ids)
+
+
+def get_owner_name(owner):
+    if isinstance(owner, str):
+        return owner
+    return getattr(owner, 'name', None) or type(owner).__name__
+
+
+class GPUResource:
+    __slots__ = ('kind', 'id', 'owner', 'nbytes')
+
+    def __init__(self, kind, id, owner, nbytes=0):
+        self.kind = kind
+        self.id = id
+        self.owner = owner
+        self.nbytes = nbytes
+
+
+class ResourceRegistry:
+    def __init__(self):
+        self.resources = {}     # (kind, id) -> GPUResource
+        self.lock = Lock()
+
+    def track(self, kind, id, owner, nbytes=0):
+        with self.lock:
+            self.resources[(kind, int(id))] = GPUResource(kind, int(id), owner, nbytes)
+        return id
+
+    def resize(self, kind, id, nbytes):
+        with self.lock:
+            resource = self.resources.get((kind, int(id)))
+            if resource is not None:
+                resource.nbytes = nbytes
+
+    def untrack(self, kind, id):
+        with self.lock:
+            self.resources.pop((kind, int(id)), None)
+
+    def delete(self, kind, ids):
+        # GL thread
+        ids = [int(id) for id in ids if id is not None]
+        if len(ids) == 0:
+            return
+        delete_objects(kind, ids)
+        for id in ids:
+            self.untrack(kind, id)
+
+    def release(self, owner):
+        # GL thread: delete every object the owner created
+        with self.lock:
+            owned = [resource for resource in self.resources.values() if resource.owner is owner]
+        for kind in RESOURCE_KINDS:
+            self.delete(kind, [resource.id for resource in owned if resource.kind == kind])
+
+    def get_owned(self, owner):
+        with self.lock:
+            return [resource for resource in self.resources.values() if resource.owner is owner]
+
+    def get_report(self):
+        # one row per owner, largest first:
+        # {'owner', 'buffers', 'vertex_arrays', 'textures', 'framebuffers', 'renderbuffers', 'bytes'}
+        with self.lock:
+            resources = list(self.resources.values())
+
+        rows = {}
+        for resource in resources:
+            row = rows.get(id(resource.owner))
+            if row is None:
+                row = rows[id(resource.owner)] = dict({'owner': get_owner_name(resource.owner), 'bytes': 0}, **{kind: 0 for kind in RESOURCE_KINDS})
+            row[resource.kind] += 1
+            row['bytes'] += resource.nbytes
+        return sorted(rows.values(), key=lambda row: -row['bytes'])
+
+    def get_totals(self):
+        totals = dict({'owners': 0, 'bytes': 0}, **{kind: 0 for kind in RESOURCE_KINDS})
+        for row in self.get_report():
+            totals['owners'] += 1
+            totals['bytes'] += row['bytes']
+            for kind in RESOURCE_KINDS:
+                totals[kind] += row[kind]
+        return totals
+
+
+gpu_resources = ResourceRegistry()
+
+
+def gen_buffer(owner):
+    return gpu_resources.track(RESOURCE_BUFFER, glGenBuffers(1), owner)
+
+def gen_vertex_array(owner):
+    return gpu_resources.track(RESOURCE_VERTEX_ARRAY, glGenVertexArrays(1), owner)
+
+def gen_texture(owner):
+    return gpu_resources.track(RESOURCE_TEXTURE, glGenTextures(1), owner)
+
+def gen_framebuffer(owner):
+    return gpu_resources.track(RESOURCE_FRAMEBUFFER, glGenFramebuffers(1), owner)
+
+def gen_renderbuffer(owner):
+    return gpu_resources.track(RESOURCE_RENDERBUFFER, glGenRenderbuffers(1), owner)
+
+
+def buffer_data(target, buffer, nbytes, data, usage):
+    # glBufferData on the bound buffer, recording its new size
+    glBufferData(target, nbytes, data, usage)
+    gpu_resources.resize(RESOURCE_BUFFER, buffer, nbytes)
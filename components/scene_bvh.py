@@ -0,0 +1,209 @@
+import numpy as np
+
+# Bounding volume hierarchy over the world bounds of scene objects (not to be confused
+# with .bvh motion files). Nodes are stored in flat arrays in depth-first order, so every
+# node covers a contiguous range of `order` and its children come after it. Queries walk
+# the tree one level at a time with every node of the level tested in a single numpy call.
+LEAF_SIZE = 4
+FULL_REFIT_FRACTION = 0.25  # refit everything when more objects than this changed
+
+
+def concat_ranges(starts, ends):
+    # concatenation of arange(start, end) for every pair
+    lengths = ends - starts
+    if lengths.sum() == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+class SceneBVH:
+    def __init__(self, objects, leaf_size=None):
+        self.leaf_size = leaf_size or LEAF_SIZE
+        self.dirty = set()
+        self.build(objects)
+
+    def build(self, objects):
+        for object in getattr(self, 'objects', []):
+            if object.scene is self:
+                object.scene = None
+
+        self.objects = []
+        self.unbounded = []     # objects without bounds are always returned
+        for object in objects:
+            object.scene = self
+            if object.get_world_bounds() is None:
+                self.unbounded.append(object)
+            else:
+                self.objects.append(object)
+        self.index = {id(object): i for i, object in enumerate(self.objects)}
+        self.dirty.clear()
+
+        count = len(self.objects)
+        self.lo = np.empty((count, 3), dtype=np.float32)
+        self.hi = np.empty((count, 3), dtype=np.float32)
+        for i, object in enumerate(self.objects):
+            bounds = object.world_bounds
+            self.lo[i], self.hi[i] = bounds.lo, bounds.hi
+
+        self.order = np.arange(count)
+        node_lo, node_hi, start, end, left, right, parent, depth = [], [], [], [], [], [], [], []
+
+        def new_node(s, e, p, d):
+            node_lo.append(None)
+            node_hi.append(None)
+            start.append(s)
+            end.append(e)
+            left.append(-1)
+            right.append(-1)
+            parent.append(p)
+            depth.append(d)
+            return len(start) - 1
+
+        if count > 0:
+            # depth-first with an explicit stack; the left child is pushed last so it is numbered first
+            centers = (self.lo + self.hi) / 2
+            stack = [(0, count, -1, 0, None)]
+            while stack:
+                s, e, p, d, side = stack.pop()
+                node = new_node(s, e, p, d)
+                if side is not None:
+                    (left if side == 0 else right)[p] = node
+
+                items = self.order[s:e]
+                node_lo[node] = self.lo[items].min(axis=0)
+                node_hi[node] = self.hi[items].max(axis=0)
+                if e - s <= self.leaf_size:
+                    continue
+
+                # median split along the longest extent of the centers
+                c = centers[items]
+                axis = int(np.argmax(c.max(axis=0) - c.min(axis=0)))
+                mid = (e - s) // 2
+                self.order[s:e] = items[np.argpartition(c[:, axis], mid)]
+                stack.append((s + mid, e, node, d + 1, 1))
+                stack.append((s, s + mid, node, d + 1, 0))
+
+        self.node_lo = np.array(node_lo, dtype=np.float32).reshape(-1, 3)
+        self.node_hi = np.array(node_hi, dtype=np.float32).reshape(-1, 3)
+        self.start = np.array(start, dtype=np.int64)
+        self.end = np.array(end, dtype=np.int64)
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.parent = np.array(parent, dtype=np.int64)
+        self.depth = np.array(depth, dtype=np.int64)
+
+        self.leaves = np.flatnonzero(self.left < 0)
+        self.leaf_of = np.empty(count, dtype=np.int64)     # object -> leaf
+        for leaf in self.leaves:
+            self.leaf_of[self.order[self.start[leaf]:self.end[leaf]]] = leaf
+        self.levels = [np.flatnonzero((self.depth == d) & (self.left >= 0)) for d in range(int(self.depth.max(initial=0)) + 1)]
+
+    def mark_dirty(self, object):
+        # called by GLObject when its world bounds change
+        self.dirty.add(object)
+
+    def refit(self):
+        # bring node bounds up to date with the objects marked dirty since the last refit
+        if len(self.dirty) == 0:
+            return
+        dirty, self.dirty = self.dirty, set()
+        if any(id(object) not in self.index or object.world_bounds is None for object in dirty):
+            # an object gained or lost its bounds
+            self.build(self.objects + self.unbounded)
+            return
+
+        changed = [self.index[id(object)] for object in dirty]
+        for i in changed:
+            bounds = self.objects[i].world_bounds
+            self.lo[i], self.hi[i] = bounds.lo, bounds.hi
+
+        if len(changed) > FULL_REFIT_FRACTION * len(self.objects):
+            self.refit_nodes(self.leaves, range(len(self.levels) - 1, -1, -1))
+            return
+
+        # only the changed leaves and their ancestors
+        leaves = np.unique(self.leaf_of[changed])
+        ancestors = set()
+        for node in self.parent[leaves]:
+            while node >= 0 and node not in ancestors:
+                ancestors.add(node)
+                node = self.parent[node]
+        ancestors = np.array(sorted(ancestors), dtype=np.int64)
+        self.refit_nodes(leaves, None, ancestors)
+
+    def refit_nodes(self, leaves, levels=None, ancestors=None):
+        if len(leaves) == len(self.leaves):
+            # leaves are numbered left to right and their ranges tile order
+            self.node_lo[leaves] = np.minimum.reduceat(self.lo[self.order], self.start[leaves])
+            self.node_hi[leaves] = np.maximum.reduceat(self.hi[self.order], self.start[leaves])
+        else:
+            for leaf in leaves:
+                items = self.order[self.start[leaf]:self.end[leaf]]
+                self.node_lo[leaf] = self.lo[items].min(axis=0)
+                self.node_hi[leaf] = self.hi[items].max(axis=0)
+
+        if ancestors is not None:
+            depths = self.depth[ancestors]
+            levels = [ancestors[depths == d] for d in range(int(depths.max(initial=-1)), -1, -1)]
+        else:
+            levels = [self.levels[d] for d in levels]
+
+        # deepest first, so children are final before their parent
+        for nodes in levels:
+            self.node_lo[nodes] = np.minimum(self.node_lo[self.left[nodes]], self.node_lo[self.right[nodes]])
+            self.node_hi[nodes] = np.maximum(self.node_hi[self.left[nodes]], self.node_hi[self.right[nodes]])
+
+    def query(self, test):
+        # test(lo, hi) -> (N,) int8 classification: 0 outside, 1 partly inside, 2 fully inside
+        # -> indices into self.objects
+        if len(self.objects) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        found = []
+        nodes = np.zeros(1, dtype=np.int64)
+        while len(nodes) > 0:
+            result = test(self.node_lo[nodes], self.node_hi[nodes])
+            inside = nodes[result == 2]
+            found.append(self.order[concat_ranges(self.start[inside], self.end[inside])])
+
+            partial = nodes[result == 1]
+            leaf = self.left[partial] < 0
+            items = self.order[concat_ranges(self.start[partial[leaf]], self.end[partial[leaf]])]
+            found.append(items[test(self.lo[items], self.hi[items]) > 0])
+
+            partial = partial[~leaf]
+            nodes = np.concatenate([self.left[partial], self.right[partial]])
+
+        return np.concatenate(found)
+
+    def query_frustum(self, frustum):
+        # objects at least partly inside the frustum, counted as drawn/culled on it
+        visible = self.query(frustum.classify_boxes)
+        frustum.drawn += len(visible) + len(self.unbounded)
+        frustum.culled += len(self.objects) - len(visible)
+        return [self.objects[i] for i in visible] + self.unbounded
+
+    def query_ray(self, origin, direction, max_t=np.inf):
+        # objects whose box the ray enters before max_t, as [(t, object)] nearest first
+        origin = np.asarray(origin, dtype=np.float32)
+        with np.errstate(divide='ignore'):
+            inverse = 1 / np.asarray(direction, dtype=np.float32)
+
+        def slab(lo, hi):
+            with np.errstate(invalid='ignore'):
+                t0, t1 = (lo - origin) * inverse, (hi - origin) * inverse
+            near = np.nan_to_num(np.minimum(t0, t1), nan=-np.inf).max(axis=1)
+            far = np.nan_to_num(np.maximum(t0, t1), nan=np.inf).min(axis=1)
+            return np.maximum(near, 0), far
+
+        def test(lo, hi):
+            near, far = slab(lo, hi)
+            return ((near <= far) & (near <= max_t)).astype(np.int8)
+
+        hits = self.query(test)
+        if len(hits) == 0:
+            return []
+        near, _ = slab(self.lo[hits], self.hi[hits])
+        order = np.argsort(near, kind='stable')
+        return [(float(near[i]), self.objects[hits[i]]) for i in order]
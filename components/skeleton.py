@@ -0,0 +1,134 @@
+import glm
+import numpy as np
+
+
+def calculate_rotation_matrix(p):
+    if p == glm.vec3(0, 0, 0):
+        return glm.mat4()
+
+    eps = 1e-6
+    up_vector = glm.vec3(0, 1, 0)
+    p = glm.normalize(p)
+
+    axis = glm.cross(up_vector, p)
+    dot_product = glm.dot(up_vector, p)
+
+    if abs(dot_product-1) < eps:
+        return glm.mat4()
+    if abs(dot_product+1) < eps:
+        return glm.mat4(
+            1, 0, 0, 0,
+            0, -1, 0, 0,
+            0, 0, -1, 0,
+            0, 0, 0, 1
+        )
+
+    angle = glm.acos(dot_product)
+
+    return glm.rotate(angle, axis)
+
+
+CHANNEL_POSITION = 0
+CHANNEL_ROTATION = 1
+
+# channel name -> (type, axis)
+CHANNEL_CODES = {
+    'XPOSITION': (CHANNEL_POSITION, 0),
+    'YPOSITION': (CHANNEL_POSITION, 1),
+    'ZPOSITION': (CHANNEL_POSITION, 2),
+    'XROTATION': (CHANNEL_ROTATION, 0),
+    'YROTATION': (CHANNEL_ROTATION, 1),
+    'ZROTATION': (CHANNEL_ROTATION, 2),
+}
+
+
+def mat4_to_array(m):
+    # row-major (4, 4) array, i.e. array[row][column]
+    return np.array(m, dtype=np.float32)
+
+
+class SkeletonTopology:
+    # Joints are stored in topological order (parents[i] < i), which is the
+    # order in which they appear in the BVH HIERARCHY section.
+    def __init__(self, names, parents, offsets, channels, thickness):
+        self.names = names
+        self.joint_cnt = len(names)
+
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.float32).reshape(-1, 3)
+        self.roots = np.flatnonzero(self.parents < 0)
+
+        self.channels = channels
+        self.channel_counts = np.array([len(c) for c in channels], dtype=np.int32)
+        self.channel_offsets = np.zeros(self.joint_cnt, dtype=np.int32)
+        np.cumsum(self.channel_counts[:-1], out=self.channel_offsets[1:])
+        self.channel_cnt = int(self.channel_counts.sum())
+        self.compile_channels()
+
+        self.children = [[] for _ in range(self.joint_cnt)]
+        self.depths = np.zeros(self.joint_cnt, dtype=np.int32)
+        for i, parent in enumerate(self.parents):
+            if parent >= 0:
+                self.children[parent].append(i)
+                self.depths[i] = self.depths[parent] + 1
+
+        # joints grouped by depth, shallowest first
+        self.levels = [np.flatnonzero(self.depths == d) for d in range(int(self.depths.max(initial=-1)) + 1)]
+
+        self.thickness = thickness
+        self.lengths = np.linalg.norm(self.offsets, axis=1)
+        self.has_mesh = (self.parents >= 0) & (self.lengths > 0)
+
+        # box mesh aligned with the bone and scaled to its length
+        self.shape_transforms = np.empty((self.joint_cnt, 4, 4), dtype=np.float32)
+        for i in range(self.joint_cnt):
+            offset = glm.vec3(*self.offsets[i])
+            self.shape_transforms[i] = mat4_to_array(
+                calculate_rotation_matrix(offset) * glm.scale(glm.vec3(thickness, glm.l2Norm(offset), thickness))
+            )
+
+    def compile_channels(self):
+        # one entry per motion column
+        self.channel_joints = np.repeat(np.arange(self.joint_cnt, dtype=np.int32), self.channel_counts)
+        self.channel_slots = np.arange(self.channel_cnt, dtype=np.int32) - self.channel_offsets[self.channel_joints]
+        codes = np.array([CHANNEL_CODES[name] for channels in self.channels for name in channels], dtype=np.int8).reshape(-1, 2)
+        self.channel_types = codes[:, 0]
+        self.channel_axes = codes[:, 1]
+        self.rotation_mask = self.channel_types == CHANNEL_ROTATION
+
+        # every position channel comes before the rotation channels of its joint
+        last_position = np.full(self.joint_cnt, -1)
+        first_rotation = np.full(self.joint_cnt, self.channel_cnt)
+        np.maximum.at(last_position, self.channel_joints[~self.rotation_mask], self.channel_slots[~self.rotation_mask])
+        np.minimum.at(first_rotation, self.channel_joints[self.rotation_mask], self.channel_slots[self.rotation_mask])
+        self.positions_first = bool(np.all(last_position < first_rotation))
+
+        # FK ops: the k-th channel of every joint, grouped by (type, axis), in application order
+        self.channel_ops = []
+        for slot in range(int(self.channel_counts.max(initial=0))):
+            for channel_type in (CHANNEL_POSITION, CHANNEL_ROTATION):
+                for axis in range(3):
+                    columns = np.flatnonzero((self.channel_slots == slot) & (self.channel_types == channel_type) & (self.channel_axes == axis))
+                    if len(columns) > 0:
+                        self.channel_ops.append((channel_type, axis, self.channel_joints[columns], columns))
+
+
+def build_topology(parts, roots):
+    index = {name: i for i, name in enumerate(parts)}
+
+    names = []
+    parents = []
+    offsets = []
+    channels = []
+
+    for partname, part in parts.items():
+        parentname = part['parent']
+        names.append(f'{parentname}-{partname}')
+        parents.append(index[parentname] if parentname is not None else -1)
+        offsets.append(part['offset'])
+        channels.append([channel.upper() for channel in part.get('channels', [])])
+
+    offset_dist_sum = float(np.linalg.norm(np.asarray(offsets, dtype=np.float64), axis=1).sum())
+    thickness = offset_dist_sum / (len(parts)-len(roots)) / 3
+
+    return SkeletonTopology(names, parents, offsets, channels, thickness)
@@ -0,0 +1,222 @@
+import os
+from threading import Lock
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+
+from OpenGL.GL import *
+from PIL import Image
+
+from .resources import *
+
+# Textures are shared by absolute path: every material using a file holds one reference
+# to the same GL texture, which is deleted when the last reference is released.
+# Images are decoded on a thread pool as soon as a material names them, and downscaled
+# when they would push the textures over the memory budget.
+TEXTURE_BUDGET_BYTES = 1 << 30
+TEXTURE_MAX_SIZE = 8192     # longest side, larger images are downscaled
+TEXTURE_MIN_SIZE = 256      # longest side the budget can downscale to; past it the budget is exceeded
+DECODE_WORKERS = 4
+
+
+@dataclass
+class TextureImage:
+    # decoded pixels, rows bottom to top as glTexImage2D expects
+    width: int
+    height: int
+    format: int
+    data: bytes
+
+
+def texture_nbytes(width, height, format):
+    # level 0 plus the mipmap chain, which adds about a third
+    return width * height * (4 if format == GL_RGBA else 3) * 4 // 3
+
+
+def texture_format(img):
+    if 'A' in img.getbands() or img.mode == 'P' and 'transparency' in img.info:
+        return GL_RGBA
+    return GL_RGB
+
+
+def fit_size(width, height, format, max_size=None, max_bytes=None, min_size=1):
+    # halve the image until it is within both limits; max_bytes does not take it below min_size
+    while width > 1 or height > 1:
+        too_large = max_size is not None and max(width, height) > max_size
+        over_budget = max_bytes is not None and texture_nbytes(width, height, format) > max_bytes and max(width, height) // 2 >= min_size
+        if not (too_large or over_budget):
+            break
+        width, height = max(1, width // 2), max(1, height // 2)
+    return width, height
+
+
+def decode_image(img, format, size):
+    img = img.convert('RGBA' if format == GL_RGBA else 'RGB')
+    if size != img.size:
+        img = img.resize(size, Image.BOX)
+    img = img.transpose(Image.FLIP_TOP_BOTTOM)
+    return TextureImage(size[0], size[1], format, img.tobytes())
+
+
+def create_texture(image, texture_unit=GL_TEXTURE0, owner=None):
+    texture = gen_texture(owner)
+    glActiveTexture(texture_unit)
+    glBindTexture(GL_TEXTURE_2D, texture)
+
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+
+    # RGB rows are not 4-byte aligned in general
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, image.format, image.width, image.height, 0, image.format, GL_UNSIGNED_BYTE, image.data)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 4)
+    glGenerateMipmap(GL_TEXTURE_2D)
+    gpu_resources.resize(RESOURCE_TEXTURE, texture, texture_nbytes(image.width, image.height, image.format))
+    return texture
+
+
+class TextureEntry:
+    def __init__(self, path):
+        self.path = path
+        self.future = None      # decoded TextureImage
+        self.texture = None
+        self.refcount = 0
+        self.prefetches = 0     # prefetches not acquired yet, see cancel
+        self.nbytes = 0         # reserved against the budget from decode until the texture is deleted
+
+
+class TextureManager:
+    def __init__(self, budget_bytes=None, max_size=None, workers=None):
+        self.name = 'textures'
+        self.budget_bytes = budget_bytes
+        self.max_size = max_size
+        self.workers = workers
+        self.pool = None
+        self.entries = {}
+        self.reserved = 0
+        self.lock = Lock()
+
+    def get_budget(self):
+        return self.budget_bytes if self.budget_bytes is not None else TEXTURE_BUDGET_BYTES
+
+    def decode(self, entry):
+        # only the header is read here, so the size can be reserved before decoding
+        img = Image.open(entry.path)
+        format = texture_format(img)
+        name = os.path.basename(entry.path)
+        full_size = fit_size(*img.size, format, self.max_size or TEXTURE_MAX_SIZE)
+        with self.lock:
+            available = self.get_budget() - self.reserved
+            size = fit_size(*full_size, format, None, max(0, available), TEXTURE_MIN_SIZE)
+            entry.nbytes = texture_nbytes(*size, format)
+            self.reserved += entry.nbytes
+
+        if size != full_size:
+            print("Texture budget exceeded, downscaling", name, f"from {full_size[0]}x{full_size[1]}")
+        if entry.nbytes > available:
+            print("Texture budget exceeded by", name)
+
+        try:
+            image = decode_image(img, format, size)
+        except:
+            with self.lock:
+                self.reserved -= entry.nbytes
+                entry.nbytes = 0
+            raise
+        print("Loaded", name, f"({image.width}x{image.height})")
+        return image
+
+    def get_entry(self, path, prefetch):
+        path = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                entry = self.entries[path] = TextureEntry(path)
+            if prefetch:
+                entry.prefetches += 1
+            elif entry.prefetches > 0:
+                entry.prefetches -= 1
+            if entry.texture is None and entry.future is None:
+                if self.pool is None:
+                    self.pool = ThreadPoolExecutor(max_workers=self.workers or DECODE_WORKERS, thread_name_prefix='texture')
+                entry.future = self.pool.submit(self.decode, entry)
+        return entry
+
+    def prefetch(self, path):
+        # start decoding without a GL context; acquire picks the result up, or cancel drops it
+        return self.get_entry(path, True)
+
+    def cancel(self, path):
+        # a prefetch that will not be acquired, e.g. of a load that was cancelled or failed;
+        # the decoded image and its reserved bytes go once no prefetch or reference is left
+        path = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry.prefetches == 0:
+                return
+            entry.prefetches -= 1
+            if entry.prefetches > 0 or entry.refcount > 0:
+                return
+            del self.entries[path]
+            future, entry.future = entry.future, None
+
+        # still decoding: the bytes it reserves are given back once it is done
+        if future is not None and not future.cancel():
+            future.add_done_callback(lambda future, entry=entry: self.forget(entry))
+
+    def forget(self, entry):
+        with self.lock:
+            self.reserved -= entry.nbytes
+            entry.nbytes = 0
+
+    def acquire(self, path):
+        # GL thread: texture of the file with one more reference, or None if it can not be loaded
+        entry = self.get_entry(path, False)
+        if entry.texture is None:
+            try:
+                image = entry.future.result()
+            except Exception as e:
+                print("Failed to load texture:", entry.path, e)
+                with self.lock:
+                    entry.future = None
+                    if entry.refcount == 0:
+                        self.entries.pop(entry.path, None)
+                return None
+            entry.texture = create_texture(image, owner=self)
+            entry.future = None
+
+        with self.lock:
+            entry.refcount += 1
+        return entry.texture
+
+    def release(self, path):
+        path = os.path.abspath(path)
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None or entry.refcount == 0:
+                return
+
+            entry.refcount -= 1
+            if entry.refcount > 0:
+                return
+            texture, entry.texture = entry.texture, None
+            self.reserved -= entry.nbytes
+            entry.nbytes = 0
+            # a load that prefetched the file keeps the entry, and decodes it again when it acquires
+            if entry.prefetches == 0:
+                del self.entries[path]
+
+        gpu_resources.delete(RESOURCE_TEXTURE, [texture])
+
+    def get_stats(self):
+        with self.lock:
+            entries = list(self.entries.values())
+        return {
+            'textures': sum(entry.texture is not None for entry in entries),
+            'decoding': sum(entry.future is not None for entry in entries),
+            'references': sum(entry.refcount for entry in entries),
+            'bytes': self.reserved,
+            'budget': self.get_budget(),
+        }
+
+
+texture_manager = TextureManager()
@@ -0,0 +1,147 @@
+from OpenGL.GL import *
+import glm
+import numpy as np
+
+from .resources import *
+
+# std140 uniform blocks shared by every draw, see shader/vertex_shader.glsl:
+#   Frame    (binding 0) view projection, viewport scaler, view position and lights,
+#                        uploaded once per frame
+#   Material (binding 1) one block per material, uploaded when the material is prepared
+#                        and selected per draw with glBindBufferRange
+FRAME_BINDING = 0
+MATERIAL_BINDING = 1
+
+MAX_LIGHTS = 10     # array size in the shaders
+
+# Frame: mat4 VP, mat4 ViewPortScaler, vec4 view_pos, vec4 light_pos[], vec4 light_color[]
+# light_pos.w is 1 for enabled lights
+FRAME_VP_OFFSET = 0
+FRAME_FLOATS = 16 + 16 + 4 + 4*MAX_LIGHTS + 4*MAX_LIGHTS
+
+# Material: vec4 Ka, vec4 Kd, vec4 Ks (w = Ns), ivec4 maps (x = diffuse, y = normal)
+MATERIAL_FLOATS = 16
+
+
+def bind_uniform_blocks(program):
+    glUniformBlockBinding(program, glGetUniformBlockIndex(program, 'Frame'), FRAME_BINDING)
+    glUniformBlockBinding(program, glGetUniformBlockIndex(program, 'Material'), MATERIAL_BINDING)
+
+
+def mat4_floats(m):
+    # glm matrices are column-major, as std140 expects
+    return np.array(m.to_list(), dtype=np.float32).reshape(-1)
+
+
+class FrameUniforms:
+    def __init__(self):
+        self.name = 'frame uniforms'
+        self.buffer = None
+        self.data = np.zeros(FRAME_FLOATS, dtype=np.float32)
+        self.uploaded = None
+
+    def prepare(self):
+        self.buffer = gen_buffer(self)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        buffer_data(GL_UNIFORM_BUFFER, self.buffer, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, FRAME_BINDING, self.buffer)
+
+    def upload(self, VP, viewport_scaler, view_pos, light_positions, light_colors, light_enabled):
+        data = self.data
+        data[0:16] = mat4_floats(VP)
+        data[16:32] = mat4_floats(viewport_scaler)
+        data[32:35] = view_pos
+
+        count = min(len(light_enabled), MAX_LIGHTS)
+        lights = data[36:].reshape(2, MAX_LIGHTS, 4)
+        lights[:] = 0
+        lights[0, :count, :3] = np.reshape(light_positions, (-1, 3))[:count]
+        lights[0, :count, 3] = np.asarray(light_enabled[:count], dtype=np.float32)
+        lights[1, :count, :3] = np.reshape(light_colors, (-1, 3))[:count]
+
+        # the block rarely changes between frames
+        if self.uploaded is not None and np.array_equal(self.uploaded, data):
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+        self.uploaded = data.copy()
+
+    def set_view_projection(self, VP):
+        # for passes drawn with another camera transform, e.g. the grid
+        self.data[0:16] = mat4_floats(VP)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, FRAME_VP_OFFSET, 64, self.data[0:16])
+        self.uploaded = None
+
+
+class MaterialTable:
+    # Material blocks live side by side in one buffer, each at an offset aligned for
+    # glBindBufferRange; a material is bound by its slot index
+    def __init__(self, capacity=64):
+        self.name = 'material uniforms'
+        self.buffer = None
+        self.capacity = capacity
+        self.stride = None
+        self.used = set()
+        self.free = []
+        self.count = 0
+        self.bound = None
+
+    def prepare(self):
+        alignment = int(glGetIntegerv(GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT))
+        self.stride = (MATERIAL_FLOATS*4 + alignment - 1) // alignment * alignment
+        self.reserve(self.capacity)
+
+    def reserve(self, capacity):
+        buffer = gen_buffer(self)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, buffer)
+        buffer_data(GL_COPY_WRITE_BUFFER, buffer, capacity*self.stride, None, GL_STATIC_DRAW)
+
+        if self.buffer is not None:
+            glBindBuffer(GL_COPY_READ_BUFFER, self.buffer)
+            glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, self.count*self.stride)
+            gpu_resources.delete(RESOURCE_BUFFER, [self.buffer])
+
+        self.buffer = buffer
+        self.capacity = capacity
+        self.bound = None
+
+    def add(self, ambient, diffuse, specular, shininess, diffuse_map, normal_map):
+        # GL thread: -> slot index
+        if self.buffer is None:
+            self.prepare()
+
+        if len(self.free) > 0:
+            index = self.free.pop()
+        else:
+            if self.count == self.capacity:
+                self.reserve(2*self.capacity)
+            index = self.count
+            self.count += 1
+        self.used.add(index)
+
+        block = np.zeros(MATERIAL_FLOATS, dtype=np.float32)
+        block[0:3] = ambient
+        block[4:7] = diffuse
+        block[8:11] = specular
+        block[11] = shininess
+        block[12:14].view(np.int32)[:] = (diffuse_map, normal_map)
+
+        glBindBuffer(GL_UNIFORM_BUFFER, self.buffer)
+        glBufferSubData(GL_UNIFORM_BUFFER, index*self.stride, block.nbytes, block)
+        return index
+
+    def remove(self, index):
+        if index in self.used:
+            self.used.remove(index)
+            self.free.append(index)
+
+    def bind(self, index):
+        if index == self.bound:
+            return
+        glBindBufferRange(GL_UNIFORM_BUFFER, MATERIAL_BINDING, self.buffer, index*self.stride, MATERIAL_FLOATS*4)
+        self.bound = index
+
+
+frame_uniforms = FrameUniforms()
+material_table = MaterialTable()
@@ -5,6 +5,8 @@ from controller_tabs.camera_control import CameraController
 from controller_tabs.filter_control import FilterController
 from controller_tabs.light_control import LightController
 from controller_tabs.mesh_control import MeshController
+from controller_tabs.loader_control import LoaderController
+from controller_tabs.resource_control import ResourceController
 
 from manager import RenderManager as RM
 
@@ -23,11 +25,15 @@ class Controller(QWidget):
         self.meshController = MeshController()
         self.filterController = FilterController()
         self.lightController = LightController()
+        self.loaderController = LoaderController()
+        self.resourceController = ResourceController()
         
         self.tab_widget.addTab(self.cameraController, "Camera")
         self.tab_widget.addTab(self.lightController, "Light")
         self.tab_widget.addTab(self.meshController, "Meshes")
         self.tab_widget.addTab(self.filterController, "Filter")
+        self.tab_widget.addTab(self.loaderController, "Loading")
+        self.tab_widget.addTab(self.resourceController, "Resources")
 
     def resizeEvent(self, event):
         self.tab_widget.setGeometry(0, 0, self.width(), self.height())
@@ -0,0 +1,108 @@
+from PySide6.QtWidgets import QScrollArea, QPushButton, QVBoxLayout, QWidget, QHBoxLayout, QLabel, QProgressBar
+from PySide6.QtCore import Qt, QTimer
+
+from components.loader import JOB_FINISHED, JOB_QUEUED, JOB_LOADING
+
+from manager import RenderManager as RM
+
+
+class LoadJobWidget(QWidget):
+    def __init__(self, job):
+        super().__init__()
+        self.job = job
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(1, 1, 1, 1)
+
+        self.label = QLabel(job.name)
+        self.label.setFixedWidth(140)
+        layout.addWidget(self.label)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        layout.addWidget(self.progress_bar)
+
+        self.state_label = QLabel()
+        self.state_label.setFixedWidth(60)
+        layout.addWidget(self.state_label)
+
+        self.cancel_button = QPushButton("X")
+        self.cancel_button.setFixedWidth(25)
+        self.cancel_button.clicked.connect(job.cancel)
+        layout.addWidget(self.cancel_button)
+
+        self.refresh()
+
+    def refresh(self):
+        job = self.job
+        self.progress_bar.setValue(int(100 * job.progress))
+        self.state_label.setText(job.state)
+        self.cancel_button.setEnabled(job.state not in JOB_FINISHED and not job.cancelled)
+        if job.error is not None:
+            self.setToolTip(str(job.error))
+
+
+class LoaderController(QWidget):
+    def __init__(self, *args, **kargs):
+        super(LoaderController, self).__init__(*args, **kargs)
+        self.job_widgets = {}
+        self.initUI()
+
+        # jobs are updated from loader threads; poll them instead of signalling across threads
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(100)
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+
+        button_layout = QHBoxLayout()
+        cancel_button = QPushButton("Cancel all")
+        cancel_button.clicked.connect(self.cancelAll)
+        button_layout.addWidget(cancel_button)
+
+        clear_button = QPushButton("Clear finished")
+        clear_button.clicked.connect(self.clearFinished)
+        button_layout.addWidget(clear_button)
+        layout.addLayout(button_layout)
+
+        self.status_label = QLabel()
+        layout.addWidget(self.status_label)
+
+        scroll_area = QScrollArea(self)
+        layout.addWidget(scroll_area)
+
+        self.scroll_widget = QWidget()
+        self.scroll_widget_layout = QVBoxLayout(self.scroll_widget)
+        self.scroll_widget_layout.setAlignment(Qt.AlignTop)
+
+        scroll_area.setWidget(self.scroll_widget)
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setStyleSheet("QScrollArea { border: none; background: none; }")
+
+    def cancelAll(self):
+        if RM.Loader is not None:
+            RM.Loader.cancel_all()
+
+    def clearFinished(self):
+        if RM.Loader is not None:
+            RM.Loader.clear_finished()
+
+    def refresh(self):
+        jobs = RM.Loader.get_jobs() if RM.Loader is not None else []
+
+        for job in list(self.job_widgets):
+            if job not in jobs:
+                self.job_widgets.pop(job).deleteLater()
+
+        for job in jobs:
+            widget = self.job_widgets.get(job)
+            if widget is None:
+                widget = LoadJobWidget(job)
+                self.job_widgets[job] = widget
+                self.scroll_widget_layout.addWidget(widget)
+            else:
+                widget.refresh()
+
+        active = sum(job.state in (JOB_QUEUED, JOB_LOADING) for job in jobs)
+        self.status_label.setText(f"Loading {active} file(s)" if active > 0 else "Idle")
@@ -5,6 +5,7 @@ from PySide6.QtCore import QSize
 from gui_components.widgets import *
 
 from manager import RenderManager as RM
+from components.animation import GLSkeleton
 
 import glm
 
@@ -12,6 +13,7 @@ class ObjectWidget(QWidget):
     def __init__(self, object, name) -> None:
         super().__init__()
         self.object = object
+        self.setAttribute(Qt.WA_StyledBackground, True)
         
         layout = QVBoxLayout(self)
 
@@ -63,7 +65,10 @@ class ObjectWidget(QWidget):
 
         tm = glm.translate(glm.vec3(*list(self.translation.values())))
         #rm = glm.rotate()
-        self.object.shape_transform = tm
+        self.object.set_transform(shape_transform=tm)
+
+    def setSelected(self, selected):
+        self.setStyleSheet("ObjectWidget { background: rgba(74, 144, 217, 60); }" if selected else "")
 
     
 
@@ -76,6 +81,7 @@ class MeshController(QWidget):
     def initUI(self):
         # 스크롤 영역 생성
         scroll_area = QScrollArea(self)
+        self.scroll_area = scroll_area
         self.setLayout(QVBoxLayout())
         self.layout().addWidget(scroll_area)
 
@@ -85,6 +91,7 @@ class MeshController(QWidget):
         self.scroll_widget_layout.setAlignment(Qt.AlignTop)
 
         self.tree_widget = None
+        self.skeleton_items = {}    # GLSkeleton -> tree item, for selection by picking
 
         # 스크롤 영역 설정
         scroll_area.setWidget(self.scroll_widget)
@@ -109,14 +116,28 @@ class MeshController(QWidget):
         objWidget = ObjectWidget(object, name)
         self.scroll_widget_layout.addWidget(objWidget)
 
+    def removeObject(self, object):
+        layout = self.scroll_widget_layout
+        for i in range(layout.count()):
+            widget = layout.itemAt(i).widget()
+            if isinstance(widget, ObjectWidget) and widget.object is object:
+                layout.takeAt(i)
+                widget.deleteLater()
+                return
+
     def loadAnimation(self):
         self.clearWidgets()
         self.tree_widget = QTreeWidget()
         self.tree_widget.setHeaderLabels(["Skeleton", ""])
         self.tree_widget.setUniformRowHeights(True)
+        self.skeleton_items = {}
 
-        for root in RM.Animation.roots:
-            self.loadAnimationTree(RM.Animation.skeletons[root], self.tree_widget)
+        for Animation in RM.Animations:
+            animation_item = QTreeWidgetItem(self.tree_widget)
+            animation_item.setText(0, Animation.name)
+            skeletons = Animation.skeletons
+            for root in Animation.roots:
+                self.loadAnimationTree(skeletons[root], animation_item)
 
         self.scroll_widget_layout.addWidget(self.tree_widget)
         self.tree_widget.expandAll()
@@ -126,16 +147,17 @@ class MeshController(QWidget):
         tree_item = QTreeWidgetItem(parent)
         tree_item.setSizeHint(0, QSize(0, 25))
         tree_item.setSizeHint(1, QSize(0, 25))
+        self.skeleton_items[skeleton] = tree_item
 
         label = CheckboxLabel(None, f"{skeleton.name}:")
                 
-        label.checkbox.stateChanged.connect(lambda state, name=skeleton.name: self.onCheckboxStateChanged(state, name))
+        label.checkbox.stateChanged.connect(lambda state, skeleton=skeleton: self.onCheckboxStateChanged(state, skeleton))
         label.layout().setContentsMargins(0, 0, 0, 2)
 
         self.tree_widget.setItemWidget(tree_item, 0, label)
 
         colorbox = ColorBox(color=QColor(255*skeleton.color[0], 255*skeleton.color[1], 255*skeleton.color[2]))
-        colorbox.colorChanged.connect(lambda color, name=skeleton.name: self.onColorChanged(color, name))
+        colorbox.colorChanged.connect(lambda color, skeleton=skeleton: self.onColorChanged(color, skeleton))
 
         self.tree_widget.setItemWidget(tree_item, 1, colorbox)
         
@@ -143,19 +165,35 @@ class MeshController(QWidget):
             self.loadAnimationTree(child, tree_item)
 
 
-    def onColorChanged(self, color, name):
-        Animation = RM.Animation
-        for skeleton in Animation.skeletons:
-            if name == skeleton.name:
-                skeleton.color = (color.red() / 255, color.green() / 255, color.blue() / 255)
+    def select(self, selection):
+        # selection: PickResult of a click in the viewport, or None
+        object = selection.object if selection is not None else None
+        layout = self.scroll_widget_layout
+        for i in range(layout.count()):
+            widget = layout.itemAt(i).widget()
+            if isinstance(widget, ObjectWidget):
+                widget.setSelected(object is not None and widget.object is object)
+                if widget.object is object:
+                    self.scroll_area.ensureWidgetVisible(widget)
+
+        if self.tree_widget is None:
+            return
+        item = None
+        if selection is not None and selection.animation is not None:
+            item = self.skeleton_items.get(GLSkeleton(selection.animation, selection.joint))
+        if item is not None:
+            self.tree_widget.setCurrentItem(item)
+            self.tree_widget.scrollToItem(item)
+        else:
+            self.tree_widget.clearSelection()
+
+    def onColorChanged(self, color, skeleton):
+        skeleton.color = (color.red() / 255, color.green() / 255, color.blue() / 255)
                 
-    def onCheckboxStateChanged(self, state, name):
-        Animation = RM.Animation
-        for skeleton in Animation.skeletons:
-            if name == skeleton.name:
-                def _func(skeleton=skeleton):
-                    skeleton.enable_mesh = not skeleton.enable_mesh
-                RM.execQueue.put(_func)
+    def onCheckboxStateChanged(self, state, skeleton):
+        def _func(skeleton=skeleton):
+            skeleton.enable_mesh = not skeleton.enable_mesh
+        RM.execQueue.put(_func)
 
     def resizeEvent(self, event):
         width = event.size().width()
@@ -0,0 +1,87 @@
+from PySide6.QtWidgets import QTreeWidget, QTreeWidgetItem, QVBoxLayout, QWidget, QLabel
+from PySide6.QtCore import QTimer
+
+from components.resources import gpu_resources
+from components.textures import texture_manager
+from components.objects import mesh_registry
+
+from manager import RenderManager as RM
+
+
+def format_bytes(nbytes):
+    return f"{nbytes / (1 << 20):.1f} MB"
+
+
+class ResourceController(QWidget):
+    def __init__(self, *args, **kargs):
+        super(ResourceController, self).__init__(*args, **kargs)
+        self.initUI()
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(500)
+
+    def initUI(self):
+        layout = QVBoxLayout(self)
+
+        self.total_label = QLabel()
+        layout.addWidget(self.total_label)
+
+        self.texture_label = QLabel()
+        layout.addWidget(self.texture_label)
+
+        self.mesh_label = QLabel()
+        layout.addWidget(self.mesh_label)
+
+        self.draw_label = QLabel()
+        layout.addWidget(self.draw_label)
+
+        self.cull_label = QLabel()
+        layout.addWidget(self.cull_label)
+
+        self.tree_widget = QTreeWidget()
+        self.tree_widget.setHeaderLabels(["Owner", "Buffers", "VAOs", "Textures", "Memory"])
+        self.tree_widget.setRootIsDecorated(False)
+        self.tree_widget.setColumnWidth(0, 140)
+        for column in range(1, 4):
+            self.tree_widget.setColumnWidth(column, 55)
+        layout.addWidget(self.tree_widget)
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+
+        report = gpu_resources.get_report()
+        totals = gpu_resources.get_totals()
+        self.total_label.setText(
+            f"{totals['buffers']} buffers, {totals['vertex_arrays']} VAOs, {totals['textures']} textures: {format_bytes(totals['bytes'])}"
+        )
+
+        stats = texture_manager.get_stats()
+        self.texture_label.setText(
+            f"Texture budget: {format_bytes(stats['bytes'])} / {format_bytes(stats['budget'])}, {stats['decoding']} decoding"
+        )
+
+        stats = mesh_registry.get_stats()
+        self.mesh_label.setText(f"Meshes: {stats['meshes']} uploaded, {stats['references']} in use")
+
+        stats = RM.RenderStats
+        if stats:
+            self.draw_label.setText(f"Draws: {stats['draws']}, {stats['state_changes']} state changes ({stats['saved']} saved by sorting)")
+        else:
+            self.draw_label.setText("Draws: -")
+
+        stats = RM.CullStats
+        if stats:
+            self.cull_label.setText(f"Culling: {stats['drawn']} drawn, {stats['culled']} culled")
+        else:
+            self.cull_label.setText("Culling: off")
+
+        self.tree_widget.clear()
+        for row in report:
+            item = QTreeWidgetItem(self.tree_widget)
+            item.setText(0, row['owner'])
+            item.setText(1, str(row['buffers']))
+            item.setText(2, str(row['vertex_arrays']))
+            item.setText(3, str(row['textures']))
+            item.setText(4, format_bytes(row['bytes']))
@@ -43,6 +43,8 @@ def main():
     RM.Camera.controller = window.controller.cameraController
     RM.MeshController = window.controller.meshController
     RM.FilterController = window.controller.filterController
+    RM.LoaderController = window.controller.loaderController
+    RM.ResourceController = window.controller.resourceController
 
     
     window.show()
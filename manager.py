@@ -1,5 +1,6 @@
 from camera import Camera
 from components.objects import *
+from components.animation import INTERPOLATE_EULER, INTERPOLATE_QUATERNION
 from queue import Queue
 from threading import Lock
 
@@ -20,16 +21,25 @@ class LockedQueue(Queue):
 class RenderManager:
     execQueue = LockedQueue()
 
+    LOADER_WORKERS = 4
+    Loader = None # LoaderService, created in OpenGLWidget.initializeGL
+
     Camera = Camera()
     Scaler = 1.0
     Filter = None
 
     Objects = None
-    Animation = None
+    SceneBVH = None # over the world bounds of Objects, see components/scene_bvh.py
+    Animations = []
+    RenderStats = {} # draws and state changes of the last render queue flush
+    CullStats = {} # objects and bones drawn and culled in the last frame
+    Selection = None # PickResult of the last click in the viewport, see components/picking.py
 
     BackgroundColor = (0.0, 0.0, 0.0)
 
     MeshController = None
+    LoaderController = None
+    ResourceController = None
     FilterController = None
     LightController = None
 
@@ -51,11 +61,28 @@ class RenderManager:
 
     DRAW_MODE = DRAW_MESH
     PAUSED = False
+    PLAYBACK_SPEED = 1.0
+    FIXED_TIMESTEP = None # seconds per paint for deterministic playback, None follows the wall clock
 
     ENABLE_GRID = True
     ENABLE_INTERPOLATION = False
+    INTERPOLATION_MODE = INTERPOLATE_EULER
     ENABLE_SHADE = True
     ENABLE_FILTER = False
+    ENABLE_BVH_CACHE = True
+    ENABLE_MESH_CACHE = True
+    ENABLE_BAKE = False
+    ENABLE_STREAMING = True
+    ENABLE_RENDER_QUEUE = True
+    ENABLE_CULLING = True
+    ENABLE_SCENE_BVH = True
+    ENABLE_PICKING = True
+
+    BAKE_CHUNK_FRAMES = 256
+    BAKE_MAX_BYTES = 512 << 20
+
+    OBJ_PARSE_WORKERS = None # processes used to parse large OBJ files, None uses every CPU
+    STREAM_MIN_BYTES = 32 << 20 # OBJ files at least this large are drawn progressively while they load
 
     FIX_ORIGIN = False
 
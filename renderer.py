@@ -8,6 +8,12 @@ from components.objects import *
 from components.grid import Grid, Axis
 from components.obj_loader import *
 from components.bvh_loader import *
+from components.uniforms import bind_uniform_blocks, frame_uniforms
+from components.render_queue import RenderQueue
+from components.bounds import Frustum
+from components.scene_bvh import SceneBVH
+from components.picking import pick, sort_by_entry
+from components.loader import LoaderService
 
 from manager import RenderManager as RM
 
@@ -25,6 +31,7 @@ scaleFactor = ctypes.windll.shcore.GetScaleFactorForDevice(0) / 100
 class MM: # Mouse Manager
     # Mouse Callback
     xpos, ypos = 0, 0
+    press = None    # where the left button went down; a release close to it picks
 
     def __enter__(self):
         return self
@@ -38,29 +45,26 @@ class OpenGLWidget(QOpenGLWidget):
         super().__init__()
         self.setFocusPolicy(Qt.StrongFocus)
         self.setAcceptDrops(True)
-        self.dropFile = None
-        self.g_time = 0
         self.FBO = None
         self.texture = None
+        self.RBO = None
 
     def initializeGL(self):
-        # initialize glfw
-        if not glfwInit():
-            return
+        if RM.Loader is None:
+            RM.Loader = LoaderService(RM.execQueue, max_workers=RM.LOADER_WORKERS)
 
-        FBO = glGenFramebuffers(1)
+        FBO = gen_framebuffer('framebuffer')
         glBindFramebuffer(GL_FRAMEBUFFER, FBO)
 
-        texture = glGenTextures(1)
+        texture = gen_texture('framebuffer')
         glBindTexture(GL_TEXTURE_2D, texture)
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, int(scaleFactor*self.width()), int(scaleFactor*self.height()), 0, GL_RGB, GL_UNSIGNED_BYTE, None)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
         glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, texture, 0)
 
-        RBO = glGenRenderbuffers(1)
-        glBindRenderbuffer(GL_RENDERBUFFER, RBO)
-        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, int(scaleFactor*self.width()), int(scaleFactor*self.height()))
+        RBO = gen_renderbuffer('framebuffer')
+        self.allocateFramebuffer(texture, RBO, self.width(), self.height())
+
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, texture, 0)
         glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, RBO)
 
         if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
@@ -69,6 +73,7 @@ class OpenGLWidget(QOpenGLWidget):
 
         self.FBO = FBO
         self.texture = texture
+        self.RBO = RBO
         
         GLFilter.init()
         RM.Filter = PixelateFilter()
@@ -79,18 +84,22 @@ class OpenGLWidget(QOpenGLWidget):
         self.shader_program = load_shaders(g_vertex_shader_src, g_fragment_shader_src)
 
         # get uniform locations
+        # per-frame and material data are in uniform blocks, see components/uniforms.py
         self.uniform_names = [
-            'MVP', 'M', 'view_pos', 'Scaler', 'ViewPortScaler', 
+            'M', 'useInstancing', 'Scaler',
             'diffuseMap', 'normalMap',
-            'useDiffuseMap', 'useNormalMap',
-            'Ka', 'Kd', 'Ks', 'Ns', 
             'mesh_color', 
-            'light_pos', 'light_color', 'light_enabled', 'ignore_light'
+            'ignore_light'
         ]
         self.uniform_locs = {}
         for name in self.uniform_names:
             self.uniform_locs[name] = glGetUniformLocation(self.shader_program, name)
 
+        bind_uniform_blocks(self.shader_program)
+        frame_uniforms.prepare()
+
+        self.render_queue = RenderQueue()
+
         self.grid = Grid(scale=100)
         self.axis = Axis(scale=100)
         self.grid.prepare()
@@ -101,11 +110,24 @@ class OpenGLWidget(QOpenGLWidget):
         glUniform1i(self.uniform_locs['normalMap'], 1)
 
 
+    def allocateFramebuffer(self, texture, RBO, w, h):
+        # storage of the filter framebuffer attachments, recorded with their size in bytes
+        width, height = max(1, int(scaleFactor*w)), max(1, int(scaleFactor*h))
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGB, width, height, 0, GL_RGB, GL_UNSIGNED_BYTE, None)
+        gpu_resources.resize(RESOURCE_TEXTURE, texture, width * height * 3)
+
+        glBindRenderbuffer(GL_RENDERBUFFER, RBO)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, width, height)
+        gpu_resources.resize(RESOURCE_RENDERBUFFER, RBO, width * height * 4)
+
     def resizeGL(self, w, h):
         global g_vscaler
         if h == 0:
             return
         g_vscaler = glm.scale(glm.vec3(1, w/h, 1))
+        if self.FBO is not None:
+            self.allocateFramebuffer(self.texture, self.RBO, w, h)
     
     def beforePaintGL(self):
         while not RM.execQueue.empty():
@@ -115,11 +137,10 @@ class OpenGLWidget(QOpenGLWidget):
         self.beforePaintGL()
 
         MainCamera = RM.Camera
-        Animation = RM.Animation
+        Animations = RM.Animations
         Objects = RM.Objects
         ENABLE_GRID = RM.ENABLE_GRID
         ENABLE_INTERPOLATION = RM.ENABLE_INTERPOLATION
-        PAUSED = RM.PAUSED
         DRAW_MODE = RM.DRAW_MODE
 
         defaultFBO = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
@@ -133,9 +154,6 @@ class OpenGLWidget(QOpenGLWidget):
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
-        glUniformMatrix4fv(self.uniform_locs['ViewPortScaler'], 1, GL_FALSE, glm.value_ptr(g_vscaler))
-        glUniform3f(self.uniform_locs['view_pos'], MainCamera.eye.x, MainCamera.eye.y, MainCamera.eye.z)
-
         # projection matrix
         P = MainCamera.projectionMatrix()
         # view matrix
@@ -143,37 +161,50 @@ class OpenGLWidget(QOpenGLWidget):
 
         VP = P*V * glm.scale(RM.Scaler*glm.vec3(1, 1, 1))
 
+        # clip volume of what the shader outputs, including the viewport scaler
+        frustum = Frustum(g_vscaler * VP) if RM.ENABLE_CULLING else None
+
         def Draw(object, ignore_light=False):
             object.Draw(VP, self.uniform_locs, ignore_light, DRAW_MODE)
 
-        if not PAUSED:
-            self.g_time = glfwGetTime()
-        
 
-        glUniform3fv(self.uniform_locs['light_pos'], RM.MAXLIGHTS, RM.light_positions)
-        glUniform3fv(self.uniform_locs['light_color'], RM.MAXLIGHTS, RM.light_colors)
-        glUniform1iv(self.uniform_locs['light_enabled'], RM.MAXLIGHTS, RM.light_enabled)
+        frame_uniforms.upload(VP, g_vscaler, MainCamera.eye, RM.light_positions, RM.light_colors, RM.light_enabled)
 
         if Objects is not None:
-            for Object in Objects:
-                Draw(Object, not RM.ENABLE_SHADE)
-
-        if Animation is not None and Animation.frame >= 0:
-            if self.g_time > Animation.framerate:
-                glfwSetTime(0)
-                Animation.set_frame(
-                    Animation.frame+1, 
-                    fix_origin= RM.FIX_ORIGIN
-                )
-            elif ENABLE_INTERPOLATION:
-                Animation.set_frame(
-                    Animation.frame, 
-                    factor= self.g_time / Animation.framerate, 
-                    fix_origin= RM.FIX_ORIGIN
-                )
-
-        if Animation is not None:
-            Draw(Animation, not RM.ENABLE_SHADE)
+            if frustum is None:
+                visible = Objects
+            elif RM.ENABLE_SCENE_BVH:
+                visible = self.getSceneBVH().query_frustum(frustum)
+            else:
+                visible = [Object for Object in Objects if frustum.contains(Object.get_world_bounds())]
+
+            if RM.ENABLE_RENDER_QUEUE:
+                for Object in visible:
+                    self.render_queue.add_object(Object, not RM.ENABLE_SHADE, DRAW_MODE)
+                RM.RenderStats = self.render_queue.flush(self.uniform_locs)
+            else:
+                for Object in visible:
+                    Draw(Object, not RM.ENABLE_SHADE)
+
+        for Animation in Animations:
+            # frame -1 is the rest pose shown until playback starts
+            if Animation.frame >= 0:
+                clock = Animation.clock
+                clock.fixed_step = RM.FIXED_TIMESTEP
+                clock.tick()
+
+                if ENABLE_INTERPOLATION:
+                    pose = (clock.frame(), clock.factor(), RM.FIX_ORIGIN, RM.INTERPOLATION_MODE)
+                else:
+                    pose = (clock.frame(), 0, RM.FIX_ORIGIN, RM.INTERPOLATION_MODE)
+
+                if pose != Animation.pose:
+                    Animation.pose = pose
+                    Animation.set_frame(pose[0], factor= pose[1], fix_origin= pose[2], mode= pose[3])
+
+            Animation.Draw(VP, self.uniform_locs, not RM.ENABLE_SHADE, DRAW_MODE, frustum=frustum)
+
+        RM.CullStats = frustum.get_stats() if frustum is not None else {}
 
         if RM.ENABLE_FILTER:
             RM.Filter.apply(self.texture, defaultFBO)
@@ -182,6 +213,7 @@ class OpenGLWidget(QOpenGLWidget):
         VP = P*V
         
         if ENABLE_GRID:
+            frame_uniforms.set_view_projection(VP)
             self.axis.Draw(VP, self.uniform_locs, True, DRAW_WIREFRAME)
             self.grid.Draw(VP, self.uniform_locs, True, DRAW_WIREFRAME)
 
@@ -200,21 +232,47 @@ class OpenGLWidget(QOpenGLWidget):
             elif key==Qt.Key_G:
                 RM.ENABLE_GRID = not RM.ENABLE_GRID
             elif key==Qt.Key_Space:
-                if RM.PAUSED:
-                    glfwSetTime(self.g_time)
                 RM.PAUSED = not RM.PAUSED
-                if RM.Animation is not None and RM.Animation.frame == -1:
-                    RM.Animation.frame = 0
+                for Animation in RM.Animations:
+                    if Animation.frame == -1:
+                        Animation.frame = 0
+                    if RM.PAUSED:
+                        Animation.clock.pause()
+                    else:
+                        Animation.clock.play()
             elif key==Qt.Key_F:
                 RM.ENABLE_FILTER = not RM.ENABLE_FILTER
             elif key==Qt.Key_O:
                 RM.FIX_ORIGIN = not RM.FIX_ORIGIN
 
-            elif key==Qt.Key_Space:
-                if RM.Animation is not None and RM.Animation.frame == -1:
-                    RM.Animation.frame = 0
+            elif key in (Qt.Key_Right, Qt.Key_Left):
+                RM.PAUSED = True
+                for Animation in RM.Animations:
+                    if Animation.frame == -1:
+                        Animation.frame = 0
+                    Animation.clock.step(1 if key==Qt.Key_Right else -1)
+            elif key in (Qt.Key_Plus, Qt.Key_Equal, Qt.Key_Minus):
+                RM.PLAYBACK_SPEED *= 2 if key != Qt.Key_Minus else 0.5
+                for Animation in RM.Animations:
+                    Animation.clock.set_speed(RM.PLAYBACK_SPEED)
+            elif key==Qt.Key_Delete:
+                RM.Animations = []
+                RM.Selection = None
+                RM.MeshController.loadAnimation()
             elif key==Qt.Key_I:
                 RM.ENABLE_INTERPOLATION = not RM.ENABLE_INTERPOLATION
+            elif key==Qt.Key_Q:
+                if RM.INTERPOLATION_MODE == INTERPOLATE_EULER:
+                    RM.INTERPOLATION_MODE = INTERPOLATE_QUATERNION
+                else:
+                    RM.INTERPOLATION_MODE = INTERPOLATE_EULER
+            elif key==Qt.Key_B:
+                RM.ENABLE_BAKE = not RM.ENABLE_BAKE
+                for Animation in RM.Animations:
+                    if RM.ENABLE_BAKE:
+                        self.bakeAnimation(Animation)
+                    else:
+                        Animation.unbake()
             elif key==Qt.Key_1:
                 RM.DRAW_MODE = DRAW_WIREFRAME
             elif key==Qt.Key_2:
@@ -222,9 +280,19 @@ class OpenGLWidget(QOpenGLWidget):
         
         RM.execQueue.put(_func)
 
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            MM.press = (event.position().x(), event.position().y())
+
     def mouseReleaseEvent(self, event):
         MM.xpos, MM.ypos = None, None
 
+        x, y = event.position().x(), event.position().y()
+        if event.button() == Qt.MouseButton.LeftButton and MM.press is not None:
+            if abs(x-MM.press[0]) + abs(y-MM.press[1]) <= 4 and RM.ENABLE_PICKING:
+                self.pickAt(x, y)
+            MM.press = None
+
     def mouseMoveEvent(self, event):
         buttons = event.buttons()
         x, y = event.position().x(), event.position().y()
@@ -238,6 +306,41 @@ class OpenGLWidget(QOpenGLWidget):
 
         MM.xpos, MM.ypos = x, y
 
+    def getPickRay(self, x, y):
+        # ray through a widget position, in the space objects and bones are placed in (before RM.Scaler)
+        MainCamera = RM.Camera
+        S = glm.scale(RM.Scaler*glm.vec3(1, 1, 1))
+        V = glm.lookAt(MainCamera.eye, MainCamera.target, MainCamera.up)
+        inverse = glm.inverse(g_vscaler * MainCamera.projectionMatrix() * V * S)
+
+        ndc = glm.vec2(2*x/self.width() - 1, 1 - 2*y/self.height())
+        def unproject(z):
+            p = inverse * glm.vec4(ndc, z, 1)
+            return glm.vec3(p) / p.w
+
+        forward = glm.vec3(glm.inverse(S) * glm.vec4(MainCamera.target - MainCamera.eye, 0))
+        near, far = unproject(-1), unproject(1)
+        direction = glm.normalize(far - near)
+        if glm.dot(direction, forward) < 0:
+            direction, near = -direction, far
+
+        origin = glm.vec3(glm.inverse(S) * glm.vec4(MainCamera.eye, 1)) if MainCamera.isPerspective else near
+        return np.array(origin, dtype=np.float32), np.array(direction, dtype=np.float32)
+
+    def pickAt(self, x, y):
+        # select the nearest bone or mesh triangle under the cursor
+        origin, direction = self.getPickRay(x, y)
+        if RM.Objects is None:
+            candidates = []
+        elif RM.ENABLE_SCENE_BVH:
+            candidates = self.getSceneBVH().query_ray(origin, direction)
+        else:
+            candidates = sort_by_entry(origin, direction, RM.Objects)
+
+        RM.Selection = pick(origin, direction, candidates, RM.Animations)
+        if RM.MeshController is not None:
+            RM.MeshController.select(RM.Selection)
+
     def wheelEvent(self, event):
         angle = event.angleDelta().y() / 120
         RM.Camera.zoom(angle)
@@ -248,31 +351,120 @@ class OpenGLWidget(QOpenGLWidget):
         else:
             event.ignore()
  
+    def placeAnimation(self, Animation):
+        # line clips up along x, side by side
+        lo, hi = Animation.get_rest_bounds()
+        if len(RM.Animations) == 0:
+            return
+
+        last = RM.Animations[-1]
+        last_lo, last_hi = last.get_rest_bounds()
+        gap = 0.25 * max(hi[0]-lo[0], last_hi[0]-last_lo[0])
+        Animation.offset[0] = last.offset[0] + last_hi[0] - lo[0] + gap
+
+    def getSceneBVH(self):
+        # built when objects are added or removed, refit as they move
+        if RM.SceneBVH is None:
+            RM.SceneBVH = SceneBVH(RM.Objects or [])
+        else:
+            RM.SceneBVH.refit()
+        return RM.SceneBVH
+
+    def clearObjects(self):
+        if RM.Objects is not None:
+            for Object in RM.Objects:
+                Object.release()
+        RM.Objects = None
+        RM.SceneBVH = None
+        RM.Selection = None
+
+    def loadAnimation(self, path, report):
+        # loader pool: the clip is baked here too, so addAnimation does not run FK on the GL thread
+        bake = RM.ENABLE_BAKE
+        Animation = import_bvh(path, log=True, use_cache=RM.ENABLE_BVH_CACHE, progress=lambda fraction: report(0.8 * fraction if bake else fraction))
+        if bake:
+            Animation.set_baked(Animation.bake(RM.BAKE_CHUNK_FRAMES, RM.BAKE_MAX_BYTES, lambda fraction: report(0.8 + 0.2 * fraction)))
+        return Animation
+
+    def bakeAnimation(self, Animation):
+        RM.Loader.submit(Animation.name,
+            lambda report: Animation.bake(RM.BAKE_CHUNK_FRAMES, RM.BAKE_MAX_BYTES, report),
+            lambda baked: Animation.set_baked(baked) if RM.ENABLE_BAKE else None,
+        )
+
+    def addAnimation(self, Animation):
+        self.clearObjects()
+        Animation.prepare()
+        if not RM.ENABLE_BAKE:
+            Animation.unbake()
+        elif Animation.baked is None:
+            self.bakeAnimation(Animation)
+        Animation.clock.set_speed(RM.PLAYBACK_SPEED)
+        self.placeAnimation(Animation)
+        RM.Animations.append(Animation)
+        RM.PAUSED = True
+        for _Animation in RM.Animations:
+            _Animation.clock.pause()
+        RM.MeshController.loadAnimation()
+
+    def addObject(self, Object, filename):
+        RM.Animations = []
+        if RM.Objects is None:
+            RM.Objects = set()
+        RM.Objects.add(Object)
+        RM.SceneBVH = None
+        RM.MeshController.addObject(Object, filename)
+        Object.prepare()
+
+    def removeObject(self, Object):
+        if RM.Objects is not None:
+            RM.Objects.discard(Object)
+        RM.SceneBVH = None
+        if RM.Selection is not None and RM.Selection.object is Object:
+            RM.Selection = None
+        RM.MeshController.removeObject(Object)
+        Object.release()
+
+    def streamObject(self, path, filename):
+        # shows the triangles parsed so far while the file loads, then swaps in the final mesh
+        Object = GLObject(mesh=GLStreamingMesh(name=filename))
+        preview = Object.mesh
+        RM.execQueue.put(lambda: self.addObject(Object, filename))
+
+        def finish(Loaded):
+            preview.release()
+            if RM.Objects is None or Object not in RM.Objects:
+                # removed while loading
+                discard_obj(Loaded)
+                return
+            Object.mesh = Loaded.mesh
+            Object.mesh.prepare()
+            Object.update_world_bounds()
+
+        RM.Loader.submit(path,
+            lambda report: import_obj(path, log=True, workers=RM.OBJ_PARSE_WORKERS, use_cache=RM.ENABLE_MESH_CACHE, progress=report,
+                on_chunk=lambda data: RM.execQueue.put(lambda: (preview.append(data), Object.update_world_bounds()))),
+            finish,
+            lambda Loaded: (self.removeObject(Object), discard_obj(Loaded)),
+        )
+
     def dropEvent(self, event):
-        self.dropFile = [u.toLocalFile() for u in event.mimeData().urls()]
-        def _func(self=self):
-            if self.dropFile is not None:
-                for path in self.dropFile:
-                    filename = os.path.split(path)[-1]
-                    extension = filename.split('.')[-1]
-                    if extension == 'bvh':
-                        RM.Objects = None
-                        RM.Animation = import_bvh(path, log=True)
-                        RM.Animation.prepare()
-                        RM.PAUSED = True
-                        RM.MeshController.loadAnimation()
-                        self.g_time = 0
-                        glfwSetTime(0)
-
-                    if extension == 'obj':
-                        RM.Animation = None
-                        Object = import_obj(path, log=True)
-                        if RM.Objects is None:
-                            RM.Objects = set()
-                        RM.Objects.add(Object)
-                        RM.MeshController.addObject(Object, filename)
-                        Object.prepare()
-
-                self.dropFile = None
-
-        RM.execQueue.put(_func)
\ No newline at end of file
+        # files are parsed on the loader pool; only addAnimation/addObject run on the GL thread
+        for path in [u.toLocalFile() for u in event.mimeData().urls()]:
+            filename = os.path.split(path)[-1]
+            extension = filename.split('.')[-1]
+            if extension == 'bvh':
+                RM.Loader.submit(path,
+                    lambda report, path=path: self.loadAnimation(path, report),
+                    self.addAnimation,
+                )
+
+            if extension == 'obj':
+                if RM.ENABLE_STREAMING and os.path.getsize(path) >= RM.STREAM_MIN_BYTES:
+                    self.streamObject(path, filename)
+                    continue
+                RM.Loader.submit(path,
+                    lambda report, path=path: import_obj(path, log=True, workers=RM.OBJ_PARSE_WORKERS, use_cache=RM.ENABLE_MESH_CACHE, progress=report),
+                    lambda Object, filename=filename: self.addObject(Object, filename),
+                    discard_obj,
+                )
@@ -4,6 +4,7 @@ import ctypes
 import numpy as np
 
 from .shader_loader import *
+from components.resources import gen_vertex_array, gen_buffer, buffer_data
 
 from PySide6.QtWidgets import QVBoxLayout, QWidget, QLabel, QLineEdit, QHBoxLayout
 from PySide6.QtCore import Qt
@@ -52,13 +53,13 @@ def _returnFullScreenVAO():
         -1, -1, 0,
     ], dtype=np.float32)
 
-    VAO = glGenVertexArrays(1)
+    VAO = gen_vertex_array('filter')
     glBindVertexArray(VAO)
 
     # 버퍼 생성 및 데이터 전송
-    fullscreen_buffer = glGenBuffers(1)
+    fullscreen_buffer = gen_buffer('filter')
     glBindBuffer(GL_ARRAY_BUFFER, fullscreen_buffer)
-    glBufferData(GL_ARRAY_BUFFER, fullscreen.nbytes, fullscreen, GL_STATIC_DRAW)
+    buffer_data(GL_ARRAY_BUFFER, fullscreen_buffer, fullscreen.nbytes, fullscreen, GL_STATIC_DRAW)
 
     # 정점 데이터 구조 설정
     glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 3 * sizeof(GLfloat), ctypes.c_void_p(0))
@@ -3,27 +3,27 @@
 in vec3 vout_surface_pos;
 in vec2 vout_uv;
 in vec3 vout_normal;
+in vec3 vout_color;
 
 out vec4 FragColor;
 
 uniform sampler2D diffuseMap;
 uniform sampler2D normalMap;
 
-uniform bool useDiffuseMap;
-uniform bool useNormalMap;
-
-uniform vec3 view_pos;
-
-uniform vec3 Ka;
-uniform vec3 Kd;
-uniform vec3 Ks;
-uniform float Ns;
-
-uniform vec3 mesh_color;
-
-uniform vec3 light_pos[10];
-uniform vec3 light_color[10];
-uniform bool light_enabled[10];
+layout (std140) uniform Frame {
+    mat4 VP;
+    mat4 ViewPortScaler;
+    vec4 view_pos;
+    vec4 light_pos[10];     // w = 1 if the light is enabled
+    vec4 light_color[10];
+};
+
+layout (std140) uniform Material {
+    vec4 Ka;
+    vec4 Kd;
+    vec4 Ks_Ns;             // w = Ns
+    ivec4 maps;             // x = diffuse map, y = normal map
+};
 
 uniform bool ignore_light;
 
@@ -35,13 +35,16 @@ void main()
     vec3 color = vec3(0, 0, 0);
     float alpha = 1.0;
 
+    bool useDiffuseMap = maps.x != 0;
+    bool useNormalMap = maps.y != 0;
+
     if(useDiffuseMap) {
         vec4 texColor = texture(diffuseMap, vout_uv);
         material_color = texColor.rgb;
         alpha = texColor.a;
     }
     else
-        material_color = mesh_color;
+        material_color = vout_color;
 
     if(alpha < 0.5)
         discard;
@@ -49,24 +52,24 @@ void main()
     vec3 normalFromMap = texture(normalMap, vout_uv).xyz * 2.0 - 1.0;
 
     if(ignore_light)
-        color = material_color * Ka * Kd;
+        color = material_color;
     else
         for(int i = 0; i < 10; i++)
         {
-            if(!light_enabled[i]) continue;
+            if(light_pos[i].w == 0) continue;
             
             // light components
-            vec3 light_ambient = light_color[i];
-            vec3 light_diffuse = light_color[i];
-            vec3 light_specular = light_color[i];
+            vec3 light_ambient = light_color[i].rgb;
+            vec3 light_diffuse = light_color[i].rgb;
+            vec3 light_specular = light_color[i].rgb;
 
             // material components
             vec3 material_ambient = material_color;
             vec3 material_diffuse = material_color;
-            vec3 material_specular = light_color[i];  // for non-metal material
+            vec3 material_specular = light_color[i].rgb;  // for non-metal material
 
             // ambient
-            vec3 ambient = 0.3 * light_ambient * material_ambient * Ka;
+            vec3 ambient = 0.3 * light_ambient * material_ambient * Ka.rgb;
 
             // for diffiuse and specular
             vec3 normal;
@@ -74,17 +77,17 @@ void main()
             else normal = normalize(vout_normal);
 
             vec3 surface_pos = vout_surface_pos;
-            vec3 light_dir = normalize(light_pos[i] - surface_pos);
+            vec3 light_dir = normalize(light_pos[i].xyz - surface_pos);
 
             // diffuse
             float diff = max(dot(normal, light_dir), 0);
-            vec3 diffuse = diff * light_diffuse * material_diffuse * Kd;
+            vec3 diffuse = diff * light_diffuse * material_diffuse * Kd.rgb;
 
             // specular
-            vec3 view_dir = normalize(view_pos - surface_pos);
+            vec3 view_dir = normalize(view_pos.xyz - surface_pos);
             vec3 reflect_dir = reflect(-light_dir, normal);
-            float spec = pow( max(dot(view_dir, reflect_dir), 0.0), Ns);
-            vec3 specular = spec * light_specular * material_specular * Ks;
+            float spec = pow( max(dot(view_dir, reflect_dir), 0.0), Ks_Ns.w);
+            vec3 specular = spec * light_specular * material_specular * Ks_Ns.rgb;
 
             color += ambient + diffuse + specular;
         }
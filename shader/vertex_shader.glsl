@@ -3,23 +3,39 @@
 layout (location = 0) in vec3 vin_pos; 
 layout (location = 1) in vec2 vin_uv; 
 layout (location = 2) in vec3 vin_normal;
+layout (location = 3) in mat4 vin_model;    // per instance, locations 3-6
+layout (location = 7) in vec3 vin_color;    // per instance
 
 out vec3 vout_surface_pos;
 out vec3 vout_normal;
 out vec2 vout_uv;
+out vec3 vout_color;
+
+layout (std140) uniform Frame {
+    mat4 VP;
+    mat4 ViewPortScaler;
+    vec4 view_pos;
+    vec4 light_pos[10];     // w = 1 if the light is enabled
+    vec4 light_color[10];
+};
 
-uniform mat4 MVP;
 uniform mat4 M;
-uniform mat4 ViewPortScaler;
+
+uniform bool useInstancing;
+uniform vec3 mesh_color;
 
 void main()
 {
     // 3D points in homogeneous coordinates
     vec4 p3D_in_hcoord = vec4(vin_pos.xyz, 1);
 
-    gl_Position = ViewPortScaler * MVP * p3D_in_hcoord;
+    mat4 model = useInstancing ? vin_model : M;
+    mat4 mvp = VP * model;
+
+    gl_Position = ViewPortScaler * mvp * p3D_in_hcoord;
 
-    vout_surface_pos = vec3(M * vec4(vin_pos, 1));
-    vout_normal = normalize( mat3(transpose(inverse(M))) * vin_normal);
+    vout_surface_pos = vec3(model * vec4(vin_pos, 1));
+    vout_normal = normalize( mat3(transpose(inverse(model))) * vin_normal);
     vout_uv = vin_uv;
+    vout_color = useInstancing ? vin_color : mesh_color;
 }
\ No newline at end of file
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from components.bvh_loader import parse_motion
+
+
+@pytest.mark.parametrize('section', [
+    "MOTION\nFrames: 2\nFrame Time: 0.1\n1 2 3\n4 5 6\n",
+    "MOTION\n\nFrames: 2\n\nFrame Time: 0.1\n1 2 3\n\n4 5 6\n\n",
+    "MOTION\r\nFrame Time: 0.1\r\nFrames: 2\r\n1 2 3\r\n\r\n4 5 6\r\n",
+])
+def test_blank_lines(section):
+    motion, frames, framerate = parse_motion(section, 3)
+    assert frames == 2 and framerate == pytest.approx(0.1)
+    np.testing.assert_array_equal(motion, [[1, 2, 3], [4, 5, 6]])
+
+
+@pytest.mark.parametrize('section, message', [
+    ("MOTION\nFrames: 3\nFrame Time: 0.1\n1 2 3\n4 5 6\n", "Frame count mismatch"),
+    ("MOTION\nFrames: 2\nFrame Time: 0.1\n1 2 3 4\n4 5 6\n", "Channel count mismatch"),
+    ("MOTION\nFrames: 2\n1 2 3\n4 5 6\n", "Invalid MOTION header"),
+    ("MOTION\nFrames: 3\nFrame Time: 0.1\n1 2 3\n4 5 6 7\n8 9\n", "Channel count mismatch"),
+    ("MOTION\nFrames: 3\nFrame Time: 0.1\n1 2 3\n\n4 5 6 7\n", "Channel count mismatch"),
+])
+def test_invalid_motion(section, message):
+    with pytest.raises(ValueError, match=message):
+        parse_motion(section, 3)
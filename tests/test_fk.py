@@ -0,0 +1,110 @@
+import glm
+import numpy as np
+import pytest
+
+from components.skeleton import SkeletonTopology
+from components.fk import forward_kinematics, global_transforms, local_transforms, bone_transforms, BakedTransforms, matrix_quaternions, quaternion_matrices
+
+
+# The per-joint glm traversal GLAnimation used before the batched FK: every joint
+# multiplies its channels in file order, and a bone's global transform is
+# parent global * translate(parent offset) * parent joint.
+joint_transform = {
+    'XPOSITION': lambda x : glm.translate((x, 0, 0)),
+    'YPOSITION': lambda y : glm.translate((0, y, 0)),
+    'ZPOSITION': lambda z : glm.translate((0, 0, z)),
+    'XROTATION': lambda t : glm.rotate(glm.radians(t), (1, 0, 0)),
+    'YROTATION': lambda t : glm.rotate(glm.radians(t), (0, 1, 0)),
+    'ZROTATION': lambda t : glm.rotate(glm.radians(t), (0, 0, 1)),
+}
+
+
+def reference_transforms(topology, channel_values, fix_origin):
+    # -> (bone globals, joint worlds) as lists of glm.mat4
+    joints = []
+    for i, channels in enumerate(topology.channels):
+        joint = glm.mat4()
+        start = topology.channel_offsets[i]
+        for k, name in enumerate(channels):
+            if not fix_origin or name not in ['XPOSITION', 'YPOSITION', 'ZPOSITION']:
+                joint *= joint_transform[name](float(channel_values[start + k]))
+        joints.append(joint)
+
+    bones, worlds = [], []
+    for i, parent in enumerate(topology.parents):
+        bone = glm.mat4() if parent < 0 else bones[parent] * glm.translate(glm.vec3(*topology.offsets[parent])) * joints[parent]
+        bones.append(bone)
+        worlds.append(bone * glm.translate(glm.vec3(*topology.offsets[i])) * joints[i])
+    return bones, worlds
+
+
+POSITIONS = ['XPOSITION', 'YPOSITION', 'ZPOSITION']
+ROTATIONS = ['ZROTATION', 'XROTATION', 'YROTATION']
+
+
+def make_topology(positions_first):
+    order = (lambda p, r: p + r) if positions_first else (lambda p, r: r + p)
+    names = ['Hips', 'Spine', 'Head', 'LeftLeg', 'LeftFoot', 'RightLeg']
+    parents = [-1, 0, 1, 0, 3, 0]
+    offsets = [[0, 0, 0], [0, 10, 0], [0, 8, 1], [5, -1, 0], [0, -20, 2], [-5, -1, 0]]
+    channels = [
+        order(POSITIONS, ROTATIONS),
+        ROTATIONS,
+        ['XROTATION', 'YROTATION'],
+        order(POSITIONS, ROTATIONS),
+        ROTATIONS[::-1],
+        [],
+    ]
+    return SkeletonTopology(names, parents, offsets, channels, 0.5)
+
+
+@pytest.mark.parametrize('positions_first', [True, False])
+@pytest.mark.parametrize('fix_origin', [False, True])
+def test_matches_glm_traversal(positions_first, fix_origin):
+    topology = make_topology(positions_first)
+    assert topology.positions_first == positions_first
+    motion = np.random.default_rng(0).uniform(-90, 90, (5, topology.channel_cnt)).astype(np.float32)
+
+    # batched over frames and one frame at a time
+    batched = forward_kinematics(topology, motion, fix_origin)
+    for frame, channel_values in enumerate(motion):
+        world = global_transforms(topology, local_transforms(topology, channel_values, fix_origin))
+        bones = bone_transforms(topology, world)
+        expected_bones, expected_world = reference_transforms(topology, channel_values, fix_origin)
+
+        np.testing.assert_allclose(world, np.array(expected_world), atol=1e-3)
+        np.testing.assert_allclose(bones, np.array(expected_bones), atol=1e-3)
+        np.testing.assert_allclose(batched[frame], world, atol=1e-4)
+
+
+def test_baked_blend_and_shared_budget():
+    topology = make_topology(True)
+    motion = np.random.default_rng(1).uniform(-90, 90, (10, topology.channel_cnt)).astype(np.float32)
+    frame_bytes = topology.joint_cnt * 16 * 4
+
+    # room for 3 chunks of 4 frames, shared by both fix_origin settings
+    baked = BakedTransforms(topology, motion, chunk_frames=4, max_bytes=3 * 4 * frame_bytes)
+    baked.fill()
+    assert len(baked.chunks) == 3
+    np.testing.assert_allclose(baked.get(9, fix_origin=True), forward_kinematics(topology, motion[9], True), atol=1e-4)
+    assert len(baked.chunks) == 3 and baked.nbytes() <= 3 * 4 * frame_bytes
+
+    # the ends of a blend are the baked frames, in between stays rigid
+    np.testing.assert_allclose(baked.get_blended(3, 0), baked.get(3), atol=1e-4)
+    np.testing.assert_allclose(baked.get_blended(3, 1), baked.get(4), atol=1e-4)
+    np.testing.assert_allclose(baked.get_blended(9, 1), baked.get(0), atol=1e-4)
+    world = baked.get_blended(3, 0.5)
+    rotation = world[:, :3, :3]
+    np.testing.assert_allclose(rotation @ rotation.transpose(0, 2, 1), np.broadcast_to(np.eye(3), rotation.shape), atol=1e-5)
+
+
+def test_matrix_quaternions_near_half_turn():
+    rng = np.random.default_rng(2)
+    axes = rng.normal(size=(200, 3))
+    axes /= np.linalg.norm(axes, axis=1, keepdims=True)
+    angles = np.concatenate([rng.uniform(0, np.pi, 100), np.pi - np.logspace(-6, -1, 100)])
+    q = np.concatenate([np.cos(angles / 2)[:, None], np.sin(angles / 2)[:, None] * axes], axis=1)
+
+    m = np.array([np.array(glm.mat4_cast(glm.quat(*row))) for row in q])
+    np.testing.assert_allclose(matrix_quaternions(m), q, atol=1e-6)
+    np.testing.assert_allclose(quaternion_matrices(q), m, atol=1e-6)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from components.obj_loader import parse_obj, parse_obj_lines
+
+
+def assert_same(data, expected):
+    for key, value in expected.items():
+        if isinstance(value, np.ndarray):
+            np.testing.assert_array_equal(data[key], value)
+        else:
+            assert data[key] == value
+
+
+def test_interleaved_lines():
+    # runs of one line each, broken up by other kinds
+    obj = b"v 0 0 0\nvn 0 0 1\nv 1 0 0\nvt 0 0\nv 0 1 0\nusemtl m\nf 1/1/1 2/1/1 3/1/1\nv 1 1 0\nf 2/1/1 4/1/1 3/1/1\n"
+    assert_same(parse_obj(obj), parse_obj_lines(obj.decode()))
+
+
+@pytest.mark.parametrize('obj', [
+    b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1 2 3\nf \n",
+    b"v 0 0 0\nv 1 0 0\nv 0 1 0\nf 1/1 2 3\n",
+    b"v 0 0 0\nv 1 0 0\nv 0 1 0\nvt 0 0\nf 1/1/1 2/1/1/1 3/1\n",
+    b"v 0 0 0 1\nv 1 0 0\nv 0 1 0 1 2\nf 1 2 3\n",
+])
+def test_malformed_lines_raise_value_error(obj):
+    # import_obj falls back to parse_obj_lines on ValueError
+    with pytest.raises(ValueError):
+        parse_obj(obj)